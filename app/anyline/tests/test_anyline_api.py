@@ -1,4 +1,4 @@
-from django.urls import reverse
+from django.urls import NoReverseMatch, reverse
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
@@ -32,6 +32,11 @@ class PrivateAnylineTests(TestCase):
         res = self.client.get(ANYLINE_URL)
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_no_detail_route(self):
+        """Test that Anyline results are only listed"""
+        with self.assertRaises(NoReverseMatch):
+            reverse('anyline:anyline-detail', args=[1])
+
 
 class PublicAnylineTests(TestCase):
     """Test the authorized Anyline API"""
@@ -2,11 +2,14 @@ from rest_framework import viewsets, mixins
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
+from core.mixins import ConditionalListMixin
+
 from .models import Anyline
 from .serializers import AnylineSerializer
 
 
-class AnylineViewSet(viewsets.GenericViewSet,
+class AnylineViewSet(ConditionalListMixin,
+                     viewsets.GenericViewSet,
                      mixins.ListModelMixin):
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
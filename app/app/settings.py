@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 """
 
 import os
+from importlib.util import find_spec
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -37,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
@@ -50,11 +52,30 @@ INSTALLED_APPS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',        
-    ]
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# MessagePack for clients asking for it, when msgpack is installed
+if find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append(
+        'core.renderers.MessagePackRenderer'
+    )
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append(
+        'core.parsers.MessagePackParser'
+    )
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -146,4 +167,112 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
-AUTH_USER_MODEL = 'user.User'
\ No newline at end of file
+# Stores content addressed product images once, see core.storage
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+
+# Media files under MEDIA_URL. MODE 'django' streams them from the worker;
+# 'x-accel-redirect' (nginx, with an internal location at ACCEL_PREFIX
+# aliasing MEDIA_ROOT) and 'x-sendfile' (Apache, lighttpd) only check the
+# request and let the proxy send the file. Content addressed names are
+# cached as immutable, other files for MAX_AGE seconds.
+MEDIA_SERVING = {
+    'MODE': os.environ.get('MEDIA_SERVING_MODE', 'django'),
+    'ACCEL_PREFIX': '/protected-media/',
+    'PUBLIC_PREFIXES': ('uploads/',),
+    'MAX_AGE': 60 * 60,
+}
+
+AUTH_USER_MODEL = 'user.User'
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    }
+}
+
+# Barcode lookups: in-process LRU in front of the shared cache above.
+# Invalidations reach other workers only through a shared backend such as
+# Redis or Memcached; on local memory the cache and the Bloom filter below
+# are bypassed unless SINGLE_PROCESS says one process serves requests, as
+# with runserver.
+BARCODE_CACHE = {
+    'ALIAS': 'default',
+    'MAX_ENTRIES': int(os.environ.get('BARCODE_CACHE_MAX_ENTRIES', 2048)),
+    'TIMEOUT': 300,
+    'SINGLE_PROCESS':
+        os.environ.get('BARCODE_CACHE_SINGLE_PROCESS', '0') == '1',
+}
+
+# Per-worker Bloom filter answering lookups for unknown barcodes without a
+# query. CAPACITY and ERROR_RATE size it: about 1.2 MB per million barcodes
+# at 1%. It grows to the catalog size when that is larger. Every
+# REBUILD_INTERVAL seconds it is rebuilt in a background thread.
+BARCODE_BLOOM = {
+    'ENABLED': True,
+    'CAPACITY': int(os.environ.get('BARCODE_BLOOM_CAPACITY', 100000)),
+    'ERROR_RATE': float(os.environ.get('BARCODE_BLOOM_ERROR_RATE', 0.01)),
+    'REBUILD_INTERVAL': 6 * 60 * 60,
+    'WARM_ON_STARTUP': True,
+}
+
+# Memory-mapped barcode index written by the build_barcode_index command and
+# shared by all workers through the page cache. CHECK_INTERVAL is how often
+# workers look for a rebuilt file, in seconds.
+BARCODE_INDEX = {
+    'PATH': os.environ.get('BARCODE_INDEX_PATH', '/vol/web/barcode.idx'),
+    'CHECK_INTERVAL': 5,
+}
+
+# Offline catalog packs, one gzipped SQLite file per shop catalog version
+CATALOG_PACK_ROOT = os.environ.get('CATALOG_PACK_ROOT', '/vol/web/catalog')
+
+# Product change feed page size
+CHANGE_FEED_PAGE_SIZE = 500
+
+# Batch barcode lookups: request size limit and barcode__in chunk size
+BARCODE_BATCH_MAX_SIZE = 1000
+BARCODE_BATCH_CHUNK_SIZE = 500
+
+# Shop assortment add/remove: request size limit
+SHOP_PRODUCTS_BATCH_MAX_SIZE = 10000
+
+# Nearby shops: largest radius in km and result cap
+SHOP_NEARBY_MAX_RADIUS = 50
+SHOP_NEARBY_MAX_RESULTS = 50
+
+# Barcode prefix autocomplete: minimum prefix length and result cap
+BARCODE_PREFIX_MIN_LENGTH = 3
+BARCODE_PREFIX_MAX_RESULTS = 50
+
+# Response compression of API media types: brotli when installed and
+# accepted, else gzip. Bodies under MIN_SIZE bytes are sent as is;
+# CACHE_ENTRIES compressed bodies are kept per worker, keyed by host, URL,
+# ETag and the varying request headers.
+RESPONSE_COMPRESSION = {
+    'MIN_SIZE': 1024,
+    'LEVEL': 6,
+    'CONTENT_TYPES': ('application/json', 'application/msgpack'),
+    'CACHE_ENTRIES': 256,
+}
+
+# Product image variants, built in a per-worker thread pool after upload
+# (synchronously when ASYNC is off). Formats Pillow cannot encode are
+# skipped.
+PRODUCT_IMAGE_VARIANTS = {
+    'SIZES': (96, 320, 960),
+    'FORMATS': ('jpeg', 'webp', 'avif'),
+    'QUALITY': 80,
+    'ASYNC': os.environ.get('PRODUCT_IMAGE_ASYNC', '1') == '1',
+    'WORKERS': int(os.environ.get('PRODUCT_IMAGE_WORKERS', 2)),
+}
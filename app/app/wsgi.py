@@ -14,3 +14,21 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+
+def warm_barcode_bloom():
+    """Build the barcode Bloom filter before the first request, so it is
+    shared copy-on-write when the server preloads the app"""
+    from django.db import DatabaseError
+    from shop.bloom import barcode_bloom
+    from shop.cache import barcode_cache
+
+    if (barcode_bloom.enabled and barcode_bloom.warm_on_startup
+            and barcode_cache.enabled):
+        try:
+            barcode_bloom.rebuild()
+        except DatabaseError:
+            pass
+
+
+warm_barcode_bloom()
@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, FloatField, Sum
+
+from shop.stock import decrement_stock
+
+from .models import Cart, CartItem
+
+
+class EmptyCart(Exception):
+    """Raised when there are no open items to check out"""
+
+
+def open_items(user):
+    """Return the user's items not in a cart yet"""
+    return CartItem.objects.filter(user=user, cart=None)
+
+
+def create_cart(user, shop, item_ids=None):
+    """Put the user's open items, or those of item_ids, in a new cart at
+    shop and take them out of the shop's stock, all in one transaction.
+
+    Checkouts of a user are serialized on the user row, so concurrent
+    requests cannot put the same items in two carts. Raises EmptyCart,
+    or shop.stock.OutOfStock with nothing changed.
+    """
+    with transaction.atomic():
+        get_user_model().objects.select_for_update().filter(pk=user.pk)\
+            .values_list('pk').get()
+
+        items = open_items(user)
+        if item_ids is not None:
+            items = items.filter(pk__in=item_ids)
+        rows = list(items.values_list('id', 'product_id', 'quantity'))
+        if not rows or (item_ids is not None and
+                        len(rows) != len(set(item_ids))):
+            raise EmptyCart()
+
+        total = items.aggregate(total=Sum(
+            F('price') * F('quantity'), output_field=FloatField()
+        ))['total']
+        cart = Cart.objects.create(user=user, shop=shop, total=total)
+        Cart.items.through.objects.bulk_create(
+            Cart.items.through(cart_id=cart.pk, cartitem_id=pk)
+            for pk, _, _ in rows
+        )
+
+        quantities = {}
+        for _, product_id, quantity in rows:
+            if product_id is not None:
+                quantities[product_id] = \
+                    quantities.get(product_id, 0) + quantity
+        decrement_stock(shop.pk, quantities)
+
+    return cart
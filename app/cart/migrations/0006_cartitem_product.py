@@ -0,0 +1,20 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0021_shopproduct_quantity'),
+        ('cart', '0005_auto_20261018_0851'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='shop.Product'),
+        ),
+    ]
@@ -1,7 +1,7 @@
 from django.db import models
 from django.conf import settings
 
-from shop.models import Shop
+from shop.models import Shop, Product
 
 
 class CartItem(models.Model):
@@ -9,11 +9,18 @@ class CartItem(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    # Optional, the shop stock is only taken for items of a product
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
     name = models.CharField(max_length=255)
     price = models.FloatField()
     quantity = models.IntegerField()
     created_at = models.DateField(auto_now_add=True)
-    updated_at = models.DateField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     @property
     def total(self):
@@ -36,7 +43,7 @@ class Cart(models.Model):
     shop = models.ForeignKey(Shop, on_delete=models.CASCADE)
     completed = models.BooleanField(default=True)
     created_at = models.DateField(auto_now_add=True)
-    updated_at = models.DateField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return str(self.id)
@@ -1,17 +1,23 @@
 from rest_framework import serializers
+
+from core.serializers import SparseFieldsSerializerMixin
+from shop.models import Shop
+
 from .models import CartItem, Cart
 
 
-class CartItemSerializer(serializers.ModelSerializer):
+class CartItemSerializer(SparseFieldsSerializerMixin,
+                         serializers.ModelSerializer):
     """Serializer for cart item objects"""
 
     class Meta:
         model = CartItem
-        fields = ('id', 'name', 'price', 'quantity', 'user')
+        fields = ('id', 'product', 'name', 'price', 'quantity', 'user')
         read_only_fields = ('id', 'user')
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(SparseFieldsSerializerMixin,
+                     serializers.ModelSerializer):
     """Serializer for cart objects"""
 
     items = serializers.PrimaryKeyRelatedField(
@@ -25,3 +31,14 @@ class CartSerializer(serializers.ModelSerializer):
         model = Cart
         fields = '__all__'
         read_only_fields = ('id',)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    """Serializer for checking out the open cart items at a shop"""
+
+    shop = serializers.PrimaryKeyRelatedField(queryset=Shop.objects.all())
+    items = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        allow_empty=False
+    )
@@ -0,0 +1,28 @@
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Cart, CartItem
+
+
+def touch_carts(carts):
+    """Mark the representations of carts as out of date"""
+    carts.update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Cart.items.through)
+def cart_items_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Cart items changed through Cart.items or its reverse"""
+    if reverse and action == 'pre_clear':
+        touch_carts(Cart.objects.filter(items=instance))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            touch_carts(Cart.objects.filter(pk=instance.pk))
+        elif pk_set:
+            touch_carts(Cart.objects.filter(pk__in=pk_set))
+
+
+@receiver(pre_delete, sender=CartItem)
+def cart_item_deleted(sender, instance, **kwargs):
+    """The item is about to leave the carts holding it"""
+    touch_carts(Cart.objects.filter(items=instance))
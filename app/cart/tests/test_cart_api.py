@@ -5,14 +5,20 @@ from django.contrib.auth import get_user_model
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from cart.models import Cart
+from cart.models import Cart, CartItem
 from cart.serializers import CartSerializer
 
-from shop.models import Shop, Address
+from shop.models import Shop, Product, ShopProduct, Address
 
 
 CART_URL = reverse('cart:cart-list')
 CART_ITEMS_URL = reverse('cart:cartitem-list')
+CHECKOUT_URL = reverse('cart:cart-checkout')
+
+
+def detail_url(cart_id):
+    """Return cart detail URL"""
+    return reverse('cart:cart-detail', args=[cart_id])
 
 
 def receipt_pdf_url(cart_id):
@@ -95,6 +101,26 @@ class PublicCartTests(TestCase):
         self.assertEqual(res_cart.status_code, status.HTTP_200_OK)
         self.assertEqual(res_cart.data, cart_serializer.data)
 
+    def test_cart_etag_follows_items(self):
+        """Test the cart ETag changes with the items it holds"""
+        item = CartItem.objects.create(
+            user=self.user, name='Item', price=5, quantity=1
+        )
+        cart = Cart.objects.create(user=self.user, total=5, shop=self.shop)
+        etag = self.client.get(detail_url(cart.id))['ETag']
+
+        cart.items.add(item)
+        res = self.client.get(detail_url(cart.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['items'], [item.id])
+
+        item.delete()
+        res = self.client.get(
+            detail_url(cart.id), HTTP_IF_NONE_MATCH=res['ETag']
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['items'], [])
+
     def test_cart_limited_to_user(self):
         """Test that returned cart is for authenticated user"""
         cart = Cart.objects.create(
@@ -150,6 +176,116 @@ class PublicCartTests(TestCase):
 
         self.assertTrue(exists)
 
+    def test_create_cart_decrements_stock(self):
+        """Test creating a cart takes its products out of the shop stock"""
+        product = Product.objects.create(
+            user=self.user, name='Product', description='',
+            quantity=1, price=2, barcode='98769868768'
+        )
+        stock = ShopProduct.objects.create(
+            shop=self.shop, product=product, quantity=10
+        )
+        items = [
+            self.client.post(CART_ITEMS_URL, {
+                'product': product.id, 'name': 'Product', 'price': 2,
+                'quantity': quantity,
+            }).data['id']
+            for quantity in (3, 4)
+        ]
+        payload = {'total': 14, 'shop': self.shop.id, 'items': items}
+
+        res = self.client.post(CART_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        stock.refresh_from_db()
+        self.assertEqual(stock.quantity, 3)
+
+        res = self.client.post(CART_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('items', res.data)
+        stock.refresh_from_db()
+        self.assertEqual(stock.quantity, 3)
+        self.assertEqual(Cart.objects.count(), 1)
+
+    def test_checkout(self):
+        """Test checking out the open items in a fixed number of queries"""
+        product = Product.objects.create(
+            user=self.user, name='Product', description='',
+            quantity=1, price=2, barcode='98769868768'
+        )
+        stock = ShopProduct.objects.create(
+            shop=self.shop, product=product, quantity=10
+        )
+        items = [
+            CartItem.objects.create(user=self.user, product=product,
+                                    name='Product', price=2, quantity=3),
+            CartItem.objects.create(user=self.user, name='Bag',
+                                    price=0.5, quantity=1),
+        ]
+        other_user = get_user_model().objects.create_user(
+            email='other@test.com', password='test567'
+        )
+        CartItem.objects.create(user=other_user, name='Other', price=100,
+                                quantity=1)
+
+        with self.assertNumQueries(12):
+            res = self.client.post(CHECKOUT_URL, {'shop': self.shop.id})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['total'], 6.5)
+        self.assertEqual(sorted(res.data['items']),
+                         [item.id for item in items])
+        cart = Cart.objects.get(pk=res.data['id'])
+        self.assertEqual(cart.user, self.user)
+        self.assertEqual(cart.items.count(), 2)
+        stock.refresh_from_db()
+        self.assertEqual(stock.quantity, 7)
+
+        res = self.client.post(CHECKOUT_URL, {'shop': self.shop.id})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_checkout_selected_items(self):
+        """Test checking out some of the open items"""
+        items = [
+            CartItem.objects.create(user=self.user, name=f'Item {i}',
+                                    price=1, quantity=i + 1)
+            for i in range(3)
+        ]
+
+        res = self.client.post(CHECKOUT_URL, {
+            'shop': self.shop.id, 'items': [items[0].id, items[2].id]
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['total'], 4)
+        self.assertEqual(list(CartItem.objects.filter(cart=None)),
+                         [items[1]])
+
+        res = self.client.post(CHECKOUT_URL, {
+            'shop': self.shop.id, 'items': [items[0].id, items[1].id]
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_checkout_out_of_stock(self):
+        """Test nothing is checked out when the shop runs short"""
+        product = Product.objects.create(
+            user=self.user, name='Product', description='',
+            quantity=1, price=2, barcode='98769868768'
+        )
+        ShopProduct.objects.create(shop=self.shop, product=product,
+                                   quantity=2)
+        CartItem.objects.create(user=self.user, product=product,
+                                name='Product', price=2, quantity=3)
+
+        res = self.client.post(CHECKOUT_URL, {'shop': self.shop.id})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Cart.objects.exists())
+        self.assertTrue(CartItem.objects.filter(cart=None).exists())
+
     def test_create_cart_invalid(self):
         """Test creating a cart with invalid payload"""
         payload = {
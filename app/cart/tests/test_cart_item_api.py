@@ -66,6 +66,18 @@ class PublicCartItemsTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data['results'], serializer.data)
 
+    def test_cart_items_not_modified(self):
+        """Test unchanged cart items are answered with 304"""
+        sample_cart_item(self.user)
+        etag = self.client.get(CART_ITEMS_URL)['ETag']
+
+        res = self.client.get(CART_ITEMS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        sample_cart_item(self.user)
+        res = self.client.get(CART_ITEMS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
     def test_cart_items_limited_to_user(self):
         """Test that returned cart items are for authenticated user"""
         sample_cart_item(self.user)
@@ -1,20 +1,38 @@
-from rest_framework import viewsets
+from collections import Counter
+
+from rest_framework import viewsets, status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
 
+from django.db import transaction
 from django.template.loader import get_template
 from django.http import HttpResponse
 
 from xhtml2pdf import pisa
 
+from core.mixins import ConditionalListMixin, ConditionalRetrieveMixin, \
+    SparseFieldsMixin
+from shop.stock import OutOfStock, decrement_stock
+
+from . import checkout
 from .models import CartItem, Cart
 
-from .serializers import CartItemSerializer, CartSerializer
+from .serializers import CartItemSerializer, CartSerializer, \
+    CheckoutSerializer
+
 
+def out_of_stock_error(exc):
+    return ValidationError({'items': [
+        f'Out of stock: {", ".join(map(str, sorted(exc.product_ids)))}.'
+    ]})
 
-class CartItemViewSet(viewsets.ModelViewSet):
+
+class CartItemViewSet(SparseFieldsMixin, ConditionalListMixin,
+                      ConditionalRetrieveMixin, viewsets.ModelViewSet):
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     queryset = CartItem.objects.all()
@@ -32,7 +50,8 @@ class CartItemViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class CartViewSet(viewsets.ModelViewSet):
+class CartViewSet(SparseFieldsMixin, ConditionalListMixin,
+                  ConditionalRetrieveMixin, viewsets.ModelViewSet):
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     queryset = Cart.objects.all()
@@ -58,5 +77,47 @@ class CartViewSet(viewsets.ModelViewSet):
 
         return response
 
+    @action(methods=['POST'], detail=False, url_path='checkout',
+            serializer_class=CheckoutSerializer)
+    def checkout(self, request):
+        """Check out the open cart items, or the items given, at a shop.
+
+        The total is computed by the database and the items are taken out
+        of the shop's stock.
+        """
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            cart = checkout.create_cart(
+                request.user,
+                serializer.validated_data['shop'],
+                serializer.validated_data.get('items')
+            )
+        except checkout.EmptyCart:
+            raise ValidationError({'items': ['Give open cart items to '
+                                             'check out.']})
+        except OutOfStock as exc:
+            raise out_of_stock_error(exc)
+
+        return Response(
+            CartSerializer(cart, context=self.get_serializer_context()).data,
+            status=status.HTTP_201_CREATED
+        )
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        """Create the cart and take its items out of the shop's stock"""
+        with transaction.atomic():
+            cart = serializer.save(user=self.request.user)
+            quantities = Counter()
+            for item in serializer.validated_data['items']:
+                if item.product_id is not None:
+                    quantities[item.product_id] += item.quantity
+            try:
+                decrement_stock(cart.shop_id, quantities)
+            except OutOfStock as exc:
+                raise out_of_stock_error(exc)
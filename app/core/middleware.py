@@ -0,0 +1,156 @@
+import gzip
+import re
+
+from django.conf import settings
+from django.utils.cache import cc_delim_re, patch_vary_headers
+
+from .cache import LRUCache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+ACCEPT_ENCODING_RE = re.compile(
+    r'\s*([\w*]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*'
+)
+
+
+def accepted_encodings(header):
+    """Return the content codings of an Accept-Encoding header with their
+    quality values"""
+    encodings = {}
+    for item in header.split(','):
+        match = ACCEPT_ENCODING_RE.fullmatch(item)
+        if match:
+            coding, quality = match.groups()
+            try:
+                encodings[coding.lower()] = float(quality or 1)
+            except ValueError:
+                pass
+    return encodings
+
+
+def compress(coding, content, level):
+    if coding == 'br':
+        return brotli.compress(content, quality=min(level, 11))
+    return gzip.compress(content, compresslevel=level, mtime=0)
+
+
+def suffix_etag(etag, coding):
+    """Append the content coding to the opaque tag of etag"""
+    return f'{etag[:-1]}-{coding}"' if etag.endswith('"') else etag
+
+
+class CompressionMiddleware:
+    """Compress API responses with brotli or gzip, as accepted by the
+    client.
+
+    Responses under MIN_SIZE bytes, streamed, ranged or already encoded
+    responses are left alone. Compressed bodies of responses with an ETag
+    are kept in a per-worker LRU keyed by host, URL, ETag and the request
+    headers the response varies on (always including the credentials), so
+    a representation that has not changed is compressed once.
+
+    Compressed responses get their ETag suffixed with the coding, as the
+    bytes differ from the identity representation. The suffix is taken
+    off the If-None-Match and If-Match request headers again before the
+    view compares them.
+    """
+
+    # Request headers responses depend on even without a Vary header
+    key_headers = ('Authorization', 'Cookie')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = getattr(settings, 'RESPONSE_COMPRESSION', {})
+        self.min_size = config.get('MIN_SIZE', 1024)
+        self.level = config.get('LEVEL', 6)
+        self.content_types = tuple(config.get(
+            'CONTENT_TYPES', ('application/json', 'application/msgpack')
+        ))
+        self.codings = ('br', 'gzip') if brotli is not None else ('gzip',)
+        self.cache = LRUCache(config.get('CACHE_ENTRIES', 256))
+        self.etag_re = re.compile(
+            rf'-({"|".join(self.codings)})"'
+        )
+
+    def negotiate(self, request):
+        encodings = accepted_encodings(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        for coding in self.codings:
+            if encodings.get(coding, encodings.get('*', 0)) > 0:
+                return coding
+        return None
+
+    def strip_etags(self, request):
+        """Take the coding suffixes off the conditional request headers and
+        return the coding of the representation the client has"""
+        coding = None
+        for header in ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MATCH'):
+            value = request.META.get(header)
+            if value:
+                match = self.etag_re.search(value)
+                if match:
+                    coding = match.group(1)
+                    request.META[header] = self.etag_re.sub('"', value)
+        return coding
+
+    def cache_key(self, request, response, coding):
+        """Return the compressed body cache key, or None when the response
+        may not be cached"""
+        etag = response.get('ETag')
+        vary = [
+            header for header in
+            cc_delim_re.split(response.get('Vary', '')) if header
+        ]
+        if not etag or '*' in vary:
+            return None
+        headers = sorted({
+            header.lower() for header in (*vary, *self.key_headers)
+        })
+        return (
+            request.get_host(), request.get_full_path(), etag, coding,
+            *(request.META.get(
+                'HTTP_' + header.upper().replace('-', '_'), ''
+            ) for header in headers)
+        )
+
+    def __call__(self, request):
+        client_coding = self.strip_etags(request)
+        response = self.get_response(request)
+        if response.status_code == 304 and client_coding and \
+                response.has_header('ETag'):
+            response['ETag'] = suffix_etag(response['ETag'], client_coding)
+            return response
+        if response.streaming or response.status_code != 200 or \
+                response.has_header('Content-Encoding') or \
+                not response.get('Content-Type', '').startswith(
+                    self.content_types
+                ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < self.min_size:
+            return response
+        coding = self.negotiate(request)
+        if coding is None:
+            return response
+
+        key = self.cache_key(request, response, coding)
+        content = self.cache.get(key) if key else None
+        if content is None:
+            content = compress(coding, response.content, self.level)
+            if key:
+                self.cache.set(key, content)
+        if len(content) >= len(response.content):
+            return response
+
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = coding
+        if response.has_header('ETag'):
+            response['ETag'] = suffix_etag(response['ETag'], coding)
+        return response
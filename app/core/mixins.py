@@ -0,0 +1,271 @@
+import hashlib
+
+from django.core.exceptions import FieldDoesNotExist
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+
+def row_value(row, name):
+    """Return name of a model instance or of a .values() row"""
+    if isinstance(row, dict):
+        return row[name]
+    return getattr(row, name)
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'Precondition failed.'
+    default_code = 'precondition_failed'
+
+
+class ConditionalMixin:
+    """Add ETag and Last-Modified validators to a viewset.
+
+    Validators come from the last modified column of the rows already
+    fetched for the response, not from the rendered payload, so changes
+    to related rows shown in a representation must bump that column.
+    Lists only get an ETag: a Last-Modified of the rows on a page would
+    miss rows deleted or pushed off it. Updates or deletes with a stale
+    If-Match answer 412. For matching GETs to answer 304 before
+    serializing, add ConditionalListMixin and ConditionalRetrieveMixin to
+    the viewsets serving those actions.
+    """
+
+    last_modified_field = 'updated_at'
+
+    def make_etag(self, *parts):
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        parts += (renderer.format if renderer else '',)
+        digest = hashlib.sha1(
+            ':'.join(str(part) for part in parts).encode()
+        ).hexdigest()
+        return f'"{digest}"'
+
+    def object_validators(self, instance):
+        last_modified = getattr(instance, self.last_modified_field)
+        return (
+            self.make_etag(instance.pk, last_modified.isoformat()),
+            last_modified.timestamp()
+        )
+
+    def list_validators(self, rows, page_state):
+        """Validators of a list from its fetched rows and the paginator
+        state (count, links), without serializing it"""
+        etag = self.make_etag(
+            self.request.get_full_path(), self.request.user.pk, page_state,
+            *(f'{row_value(row, "pk")}@'
+              f'{row_value(row, self.last_modified_field).isoformat()}'
+              for row in rows)
+        )
+        return etag, None
+
+    def conditional_response(self, etag, last_modified, response=None):
+        """Return the 304/412 response for the request, or response with
+        the validators set"""
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified,
+            response=response
+        )
+        if response is not None:
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def check_preconditions(self, instance):
+        if self.conditional_response(*self.object_validators(instance)):
+            raise PreconditionFailed()
+
+    def perform_update(self, serializer):
+        self.check_preconditions(serializer.instance)
+        super().perform_update(serializer)
+
+    def perform_destroy(self, instance):
+        self.check_preconditions(instance)
+        super().perform_destroy(instance)
+
+
+class ConditionalListMixin(ConditionalMixin):
+    """Answer list requests with matching validators 304"""
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            rows = page
+            page_state = self.get_paginated_response([]).data
+        else:
+            rows = list(queryset)
+            page_state = None
+
+        validators = self.list_validators(rows, page_state)
+        not_modified = self.conditional_response(*validators)
+        if not_modified is not None:
+            return not_modified
+
+        data = self.serialize_rows(rows)
+        if page is not None:
+            response = self.get_paginated_response(data)
+        else:
+            response = Response(data)
+        return self.conditional_response(*validators, response)
+
+    def serialize_rows(self, rows):
+        return self.get_serializer(rows, many=True).data
+
+
+class ConditionalRetrieveMixin(ConditionalMixin):
+    """Answer detail requests with matching validators 304"""
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        validators = self.object_validators(instance)
+        return self.conditional_response(*validators) or \
+            self.conditional_response(
+                *validators, Response(self.get_serializer(instance).data)
+            )
+
+
+class SparseFieldsMixin:
+    """Let clients pick the fields of list and detail responses with
+    ?fields=id,name or ?omit=description.
+
+    Only the columns behind the output fields are selected. List pages
+    whose fields all map to plain columns are serialized straight from
+    .values() rows, without building model instances or running every
+    serializer field. Use with core.serializers.SparseFieldsSerializerMixin.
+    """
+
+    sparse_actions = ('list', 'retrieve')
+    row_fields = None
+    # Serializer fields that output database values unchanged
+    plain_fields = (
+        serializers.BooleanField, serializers.CharField,
+        serializers.FloatField, serializers.IntegerField,
+        serializers.PrimaryKeyRelatedField,
+    )
+
+    def get_sparse_fields(self):
+        """Return the requested field names, or None for all of them"""
+        if hasattr(self, '_sparse_fields'):
+            return self._sparse_fields
+
+        self._sparse_fields = None
+        params = self.request.query_params
+        if self.action not in self.sparse_actions or \
+                not (params.get('fields') or params.get('omit')):
+            return None
+
+        serializer = self.get_serializer_class()(
+            context=super().get_serializer_context()
+        )
+        available = [name for name, field in serializer.fields.items()
+                     if not field.write_only]
+        requested = set(filter(None, params.get('fields', '').split(',')))
+        omitted = set(filter(None, params.get('omit', '').split(',')))
+        unknown = (requested | omitted) - set(available)
+        if unknown:
+            raise ValidationError({'fields': [
+                f'Unknown fields: {", ".join(sorted(unknown))}.'
+            ]})
+
+        self._sparse_fields = [
+            name for name in available
+            if (not requested or name in requested) and name not in omitted
+        ]
+        return self._sparse_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['sparse_fields'] = self.get_sparse_fields()
+        return context
+
+    def get_output_columns(self):
+        """Return (name, model field, serializer field) for the output
+        fields, or None when one of them is not backed by a model field"""
+        serializer = self.get_serializer()
+        opts = serializer.Meta.model._meta
+        columns = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            try:
+                model_field = opts.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+            if not (model_field.concrete or model_field.many_to_many):
+                return None
+            columns.append((name, model_field, field))
+        return columns
+
+    def get_row_fields(self, columns):
+        """Return (name, column, converter) for serializing .values() rows,
+        or None when a field needs a model instance"""
+        row_fields = []
+        for name, model_field, field in columns:
+            if model_field.many_to_many or \
+                    isinstance(field, serializers.FileField):
+                return None
+            convert = None if isinstance(field, self.plain_fields) \
+                else field.to_representation
+            row_fields.append((name, model_field.name, convert))
+        return row_fields
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        self.row_fields = None
+        if self.action not in self.sparse_actions:
+            return queryset
+        columns = self.get_output_columns()
+        if columns is None:
+            return queryset
+
+        # Keep the validator and ordering columns, including those the
+        # paginator orders on and reads its cursors from
+        names = {field.name for field in queryset.model._meta.fields}
+        paginator_ordering = getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(paginator_ordering, str):
+            paginator_ordering = (paginator_ordering,)
+        ordering = [
+            name for name in (*queryset.query.order_by, *paginator_ordering)
+            if isinstance(name, str)
+        ]
+        extra = [
+            name for name in dict.fromkeys(
+                [self.last_modified_field] +
+                [name.lstrip('-') for name in ordering]
+            )
+            if name in names
+        ]
+
+        if self.action == 'list':
+            self.row_fields = self.get_row_fields(columns)
+        if self.row_fields is not None:
+            return queryset.values('pk', *dict.fromkeys(
+                extra + [column for _, column, _ in self.row_fields]
+            ))
+
+        if self.get_sparse_fields() is None:
+            return queryset
+        return queryset.only(*extra, *(
+            model_field.name for _, model_field, _ in columns
+            if not model_field.many_to_many
+        ))
+
+    def serialize_rows(self, rows):
+        if self.row_fields is None:
+            return super().serialize_rows(rows)
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in self.row_fields:
+                value = row[column]
+                item[name] = value if value is None or convert is None \
+                    else convert(value)
+            data.append(item)
+        return data
@@ -0,0 +1,21 @@
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class MessagePackParser(parsers.BaseParser):
+    """Parse request bodies sent as Content-Type: application/msgpack.
+    Requires msgpack."""
+
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False,
+                                   strict_map_key=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
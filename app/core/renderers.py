@@ -0,0 +1,62 @@
+import decimal
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """JSON renderer encoding with orjson when it is installed.
+
+    Output matches JSONRenderer: values orjson does not handle itself,
+    including datetimes, go through DRF's JSON encoder. Indented output
+    for the browsable API and installs without orjson fall back to
+    JSONRenderer.
+    """
+
+    if orjson is not None:
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or \
+                self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        return orjson.dumps(
+            data, default=self.encoder_class().default, option=self.options
+        )
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """MessagePack renderer for clients sending
+    Accept: application/msgpack.
+
+    Decimals are encoded as strings and dates, times and datetimes as the
+    same ISO 8601 strings as in JSON responses, so both formats carry the
+    same values. Requires msgpack.
+    """
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def default(self, obj):
+        if isinstance(obj, decimal.Decimal):
+            return str(obj)
+        return encoders.JSONEncoder().default(obj)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self.default, use_bin_type=True,
+                             datetime=False)
@@ -0,0 +1,17 @@
+from collections import OrderedDict
+
+
+class SparseFieldsSerializerMixin:
+    """Only output the fields listed in the sparse_fields context entry,
+    set by core.mixins.SparseFieldsMixin"""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        names = self.context.get('sparse_fields')
+        if names is None:
+            return fields
+
+        return OrderedDict(
+            (name, field) for name, field in fields.items()
+            if name in names or field.write_only
+        )
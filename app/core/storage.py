@@ -0,0 +1,49 @@
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+
+CONTENT_NAME_RE = re.compile(r'^[0-9a-f]{64}(\.\w+)?$')
+
+
+def is_content_addressed(name):
+    """Whether name is named after the SHA-256 of its content"""
+    return bool(CONTENT_NAME_RE.match(os.path.basename(name)))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage storing content addressed files once.
+
+    A file named after the hash of its content that already exists holds
+    the same bytes, so saving it again only refreshes its modification
+    time, which keeps it out of the garbage collection grace period. New
+    files are written under a temporary name and moved into place, so
+    concurrent uploads of the same content never see a partial file.
+    Other names are saved as by FileSystemStorage.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        if is_content_addressed(name):
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        if not is_content_addressed(name):
+            return super()._save(name, content)
+
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            os.utime(full_path)
+            return name
+
+        return self.replace(name, content)
+
+    def replace(self, name, content):
+        """Save content under name, replacing any file there with one
+        rename, so readers and concurrent writers never find it missing or
+        partial"""
+        tmp_name = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(tmp_name), self.path(name))
+        return name
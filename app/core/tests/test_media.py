@@ -0,0 +1,81 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+
+
+CONTENT = b'0123456789' * 10
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+NAME = f'uploads/product/{DIGEST[:2]}/{DIGEST[2:4]}/{DIGEST}.jpg'
+
+
+class MediaTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings = override_settings(MEDIA_ROOT=self.tmp.name)
+        self.settings.enable()
+        default_storage.save(NAME, ContentFile(CONTENT))
+
+    def tearDown(self):
+        self.settings.disable()
+        self.tmp.cleanup()
+
+    def test_serve_content_addressed(self):
+        """Test content addressed media are cached as immutable"""
+        res = self.client.get(f'/media/{NAME}')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['ETag'], f'"{DIGEST}"')
+        self.assertIn('immutable', res['Cache-Control'])
+
+        res = self.client.get(f'/media/{NAME}',
+                              HTTP_IF_NONE_MATCH=f'"{DIGEST}"')
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_serve_range(self):
+        """Test byte ranges of media files"""
+        res = self.client.get(f'/media/{NAME}', HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(res.streaming_content), CONTENT[10:20])
+
+    def test_serve_other_names(self):
+        """Test other media files get a limited max-age"""
+        name = default_storage.save('uploads/product/image.jpg',
+                                    ContentFile(CONTENT))
+
+        res = self.client.get(f'/media/{name}')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('immutable', res['Cache-Control'])
+
+    def test_serve_outside_public_media(self):
+        """Test paths outside the public media prefixes are refused"""
+        with open(os.path.join(self.tmp.name, 'secret.txt'), 'w') as f:
+            f.write('secret')
+
+        for path in ('secret.txt', 'uploads/../secret.txt',
+                     'uploads/product/missing.jpg'):
+            res = self.client.get(f'/media/{path}')
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_x_accel_redirect(self):
+        """Test handing media transfers over to nginx"""
+        serving = {'MODE': 'x-accel-redirect',
+                   'ACCEL_PREFIX': '/protected-media/',
+                   'PUBLIC_PREFIXES': ('uploads/',)}
+        with override_settings(MEDIA_SERVING=serving):
+            res = self.client.get(f'/media/{NAME}')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Accel-Redirect'], f'/protected-media/{NAME}')
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
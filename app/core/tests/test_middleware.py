@@ -0,0 +1,128 @@
+import gzip
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from core.middleware import CompressionMiddleware, accepted_encodings
+
+
+def json_response(size=4096, etag=None):
+    response = HttpResponse(b'{"a": "' + b'x' * size + b'"}',
+                            content_type='application/json')
+    if etag:
+        response['ETag'] = etag
+    return response
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_accepted_encodings(self):
+        """Test parsing Accept-Encoding quality values"""
+        self.assertEqual(
+            accepted_encodings('gzip;q=0.5, br, identity;q=0'),
+            {'gzip': 0.5, 'br': 1.0, 'identity': 0.0}
+        )
+
+    def test_gzip_response(self):
+        """Test large responses are gzipped for clients accepting gzip"""
+        middleware = CompressionMiddleware(lambda request: json_response())
+        middleware.codings = ('gzip',)
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip')
+
+        response = middleware(request)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content),
+                         json_response().content)
+
+    def test_small_or_unaccepted_response(self):
+        """Test small responses and clients without gzip are left alone"""
+        middleware = CompressionMiddleware(
+            lambda request: json_response(size=10)
+        )
+        response = middleware(
+            self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        middleware = CompressionMiddleware(lambda request: json_response())
+        response = middleware(
+            self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_compressed_once_per_etag(self):
+        """Test unchanged representations are compressed once"""
+        middleware = CompressionMiddleware(
+            lambda request: json_response(etag='"1"')
+        )
+        middleware.codings = ('gzip',)
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip')
+
+        first = middleware(request)
+        second = middleware(request)
+
+        self.assertEqual(len(middleware.cache), 1)
+        self.assertEqual(first['ETag'], '"1-gzip"')
+        self.assertEqual(first.content, second.content)
+
+    def test_cache_keyed_on_credentials_and_host(self):
+        """Test compressed bodies are not shared between users or hosts"""
+        bodies = iter([json_response(etag='"1"'),
+                       json_response(size=5000, etag='"1"'),
+                       json_response(size=6000, etag='"1"')])
+        middleware = CompressionMiddleware(lambda request: next(bodies))
+        middleware.codings = ('gzip',)
+
+        responses = [
+            middleware(self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip',
+                                        **extra))
+            for extra in ({'HTTP_AUTHORIZATION': 'Token a'},
+                          {'HTTP_AUTHORIZATION': 'Token b'},
+                          {'HTTP_AUTHORIZATION': 'Token a',
+                           'HTTP_HOST': 'other.example'})
+        ]
+
+        self.assertEqual(len(middleware.cache), 3)
+        self.assertEqual(
+            [len(gzip.decompress(response.content))
+             for response in responses],
+            [4096 + 9, 5000 + 9, 6000 + 9]
+        )
+
+    def test_conditional_request_with_coded_etag(self):
+        """Test the coding suffix is taken off conditional headers"""
+        def view(request):
+            if request.META.get('HTTP_IF_NONE_MATCH') == '"1"':
+                response = HttpResponse(status=304)
+                response['ETag'] = '"1"'
+                return response
+            return json_response(etag='"1"')
+
+        middleware = CompressionMiddleware(view)
+        middleware.codings = ('gzip',)
+        etag = middleware(
+            self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        )['ETag']
+
+        response = middleware(self.factory.get(
+            '/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag
+        ))
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], '"1-gzip"')
+
+    def test_html_not_compressed(self):
+        """Test only API media types are compressed"""
+        middleware = CompressionMiddleware(lambda request: HttpResponse(
+            b'<p>' + b'x' * 4096 + b'</p>', content_type='text/html'
+        ))
+        response = middleware(
+            self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        )
+
+        self.assertFalse(response.has_header('Content-Encoding'))
@@ -0,0 +1,81 @@
+import datetime
+import decimal
+import json
+from collections import OrderedDict
+from io import BytesIO
+from unittest import skipUnless
+
+from django.test import SimpleTestCase
+
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from core.parsers import MessagePackParser
+from core.renderers import MessagePackRenderer, ORJSONRenderer, msgpack
+
+
+class ORJSONRendererTests(SimpleTestCase):
+
+    def test_render_matches_json_renderer(self):
+        """Test orjson output decodes to the JSONRenderer output"""
+        data = OrderedDict([
+            ('id', 1),
+            ('name', 'Lapte bătut'),
+            ('price', decimal.Decimal('10.50')),
+            ('updated_at', datetime.datetime(
+                2026, 10, 18, 8, 55, 1, 123456, tzinfo=datetime.timezone.utc
+            )),
+            ('created_at', datetime.date(2026, 10, 18)),
+            ('tags', ('a', 'b')),
+            (1, None),
+        ])
+
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render(data)),
+            json.loads(JSONRenderer().render(data))
+        )
+
+    def test_render_none(self):
+        """Test empty bodies stay empty"""
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_render_indented(self):
+        """Test indentation requested in the media type is honoured"""
+        rendered = ORJSONRenderer().render(
+            {'id': 1}, 'application/json; indent=4'
+        )
+
+        self.assertEqual(rendered, b'{\n    "id": 1\n}')
+
+
+@skipUnless(msgpack, 'msgpack is not installed')
+class MessagePackTests(SimpleTestCase):
+
+    def test_render_stable_encodings(self):
+        """Test decimals and dates are encoded as in JSON responses"""
+        rendered = MessagePackRenderer().render(OrderedDict([
+            ('price', decimal.Decimal('10.50')),
+            ('updated_at', datetime.datetime(
+                2026, 10, 18, 8, 55, 1, tzinfo=datetime.timezone.utc
+            )),
+            ('created_at', datetime.date(2026, 10, 18)),
+        ]))
+
+        self.assertEqual(msgpack.unpackb(rendered), {
+            'price': '10.50',
+            'updated_at': '2026-10-18T08:55:01Z',
+            'created_at': '2026-10-18',
+        })
+
+    def test_parse(self):
+        """Test parsing MessagePack request bodies"""
+        data = {'barcodes': ['5901234123457'], 'quantity': 2}
+
+        parsed = MessagePackParser().parse(BytesIO(msgpack.packb(data)))
+
+        self.assertEqual(parsed, data)
+
+    def test_parse_invalid(self):
+        """Test malformed bodies are refused"""
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(BytesIO(b'\xc1'))
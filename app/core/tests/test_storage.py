@@ -0,0 +1,51 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = ContentAddressedStorage(location=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_identical_content_stored_once(self):
+        """Test saving content addressed files twice keeps one copy"""
+        name = f'images/{hashlib.sha256(b"image").hexdigest()}.jpg'
+
+        first = self.storage.save(name, ContentFile(b'image'))
+        second = self.storage.save(name, ContentFile(b'image'))
+
+        self.assertEqual(first, name)
+        self.assertEqual(second, name)
+        self.assertEqual(self.storage.listdir('images'), ([], [
+            os.path.basename(name)
+        ]))
+
+    def test_other_names_not_overwritten(self):
+        """Test other names still get a free name"""
+        first = self.storage.save('images/image.jpg', ContentFile(b'a'))
+        second = self.storage.save('images/image.jpg', ContentFile(b'b'))
+
+        self.assertNotEqual(first, second)
+
+    def test_replace(self):
+        """Test replace swaps the content in under the same name"""
+        self.storage.save('variants/96.webp', ContentFile(b'a'))
+
+        name = self.storage.replace('variants/96.webp', ContentFile(b'b'))
+
+        self.assertEqual(name, 'variants/96.webp')
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'b')
+        self.assertEqual(self.storage.listdir('variants'), ([], [
+            '96.webp'
+        ]))
@@ -1,9 +1,26 @@
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
 from rest_framework.decorators import api_view, \
                                      permission_classes
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from rest_framework.permissions import IsAuthenticated
 
+from .http import file_response
+from .storage import is_content_addressed
+
+# Content addressed names never change content
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -33,3 +50,59 @@ def api_root(request, format=None):
 @api_view(['GET'])
 def ping(request, format=None):
     return Response('Ok')
+
+
+def media_path(name):
+    """Return the file system path of a public media file, or raise
+    Http404"""
+    config = settings.MEDIA_SERVING
+    if not name.startswith(tuple(config.get('PUBLIC_PREFIXES', ('',)))) \
+            or any(part.startswith('.') for part in name.split('/')):
+        raise Http404
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(path):
+        raise Http404
+    return path
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a media file, or authorize it and hand the transfer over to
+    the front proxy with X-Accel-Redirect or X-Sendfile"""
+    config = settings.MEDIA_SERVING
+    full_path = media_path(path)
+    stat = os.stat(full_path)
+    last_modified = int(stat.st_mtime)
+    content_type = mimetypes.guess_type(full_path)[0] or \
+        'application/octet-stream'
+    if is_content_addressed(path):
+        etag = f'"{os.path.splitext(os.path.basename(path))[0]}"'
+        cache_control = IMMUTABLE_CACHE_CONTROL
+    else:
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        cache_control = f'public, max-age={config.get("MAX_AGE", 3600)}'
+
+    mode = config.get('MODE', 'django')
+    if mode == 'django':
+        return file_response(
+            request, full_path, content_type, etag=etag,
+            last_modified=last_modified, cache_control=cache_control
+        )
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    ) or HttpResponse(content_type=content_type)
+    if response.status_code == 200:
+        if mode == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = quote(
+                config.get('ACCEL_PREFIX', '/protected-media/') + path
+            )
+        else:
+            response['X-Sendfile'] = full_path
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    return response
@@ -1,6 +1,8 @@
 from django.contrib import admin
 
-from .models import Shop, Product, Address
+from .assortment import membership_changed
+from .models import Shop, Product, ShopProduct, Address
+from .search import search_products
 
 
 @admin.register(Product)
@@ -8,13 +10,23 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'description', 'quantity',
                     'price', 'barcode', 'image', 'is_active')
     list_editable = ('barcode',)
-    search_fields = ('name', 'description', 'quantity',
-                     'price', 'barcode', 'image', 'is_active')
+    search_fields = ('name', 'description', 'barcode')
     list_per_page = 10
 
+    def get_search_results(self, request, queryset, search_term):
+        """Search on the product search indexes instead of icontains"""
+        if not search_term:
+            return queryset, False
+        return search_products(queryset, search_term), False
+
+
+def product_ids(shop):
+    return set(ShopProduct.objects.filter(shop=shop)
+               .values_list('product_id', flat=True))
+
 
 class ShopProductsInline(admin.TabularInline):
-    model = Shop.products.through
+    model = ShopProduct
     extra = 0
     verbose_name = "Product"
     verbose_name_plural = "Products"
@@ -28,6 +40,18 @@ class ShopAdmin(admin.ModelAdmin):
     inlines = [ShopProductsInline]
     exclude = ('products',)
 
+    def save_related(self, request, form, formsets, change):
+        """Record the products the inline added or removed in bulk, as
+        through rows send no membership signals"""
+        shop = form.instance
+        before = product_ids(shop)
+        super().save_related(request, form, formsets, change)
+        after = product_ids(shop)
+        if after - before:
+            membership_changed(shop, after - before, False)
+        if before - after:
+            membership_changed(shop, before - after, True)
+
 
 @admin.register(Address)
 class AddressAdmin(admin.ModelAdmin):
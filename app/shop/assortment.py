@@ -0,0 +1,50 @@
+from django.db import transaction
+
+from .models import ShopProduct
+from .signals import bump_catalog_versions, invalidate_memberships, \
+    record_membership_changes
+
+
+def current_product_ids(shop, product_ids):
+    return set(
+        ShopProduct.objects.filter(shop=shop, product_id__in=product_ids)
+        .values_list('product_id', flat=True)
+    )
+
+
+def membership_changed(shop, product_ids, deleted):
+    """Do what the membership signals do for one bulk change"""
+    if deleted:
+        invalidate_memberships([shop.pk], product_ids)
+    bump_catalog_versions([shop.pk])
+    record_membership_changes([shop.pk], product_ids, deleted)
+
+
+def add_products(shop, product_ids):
+    """Add products to a shop with one insert and return the ids of those
+    it did not carry yet.
+
+    Bulk inserts send no signals, so the change is recorded here.
+    """
+    with transaction.atomic():
+        added = set(product_ids) - current_product_ids(shop, product_ids)
+        ShopProduct.objects.bulk_create(
+            (ShopProduct(shop=shop, product_id=pk) for pk in added),
+            ignore_conflicts=True
+        )
+        if added:
+            membership_changed(shop, added, False)
+    return added
+
+
+def remove_products(shop, product_ids):
+    """Remove products from a shop with one delete and return the ids of
+    those it carried"""
+    with transaction.atomic():
+        removed = current_product_ids(shop, product_ids)
+        if removed:
+            ShopProduct.objects.filter(
+                shop=shop, product_id__in=removed
+            ).delete()
+            membership_changed(shop, removed, True)
+    return removed
@@ -0,0 +1,192 @@
+import datetime
+import hashlib
+import logging
+import math
+import time
+from threading import Lock, Thread
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .cache import barcode_cache
+from .gtin import product_key
+
+
+logger = logging.getLogger(__name__)
+
+# Allowance for clock skew between workers and the database when catching
+# up with products updated since the last catch up
+CATCH_UP_SKEW = datetime.timedelta(seconds=5)
+
+
+class BloomFilter:
+    """Fixed size Bloom filter over strings"""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = max(int(math.ceil(
+            -self.capacity * math.log(error_rate) / math.log(2) ** 2
+        )), 8)
+        self.hashes = max(int(round(
+            self.size / self.capacity * math.log(2)
+        )), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+    def stats(self):
+        fill = 1 - math.exp(-self.hashes * self.count / self.size)
+        return {
+            'capacity': self.capacity,
+            'error_rate': self.error_rate,
+            'estimated_error_rate': fill ** self.hashes,
+            'items': self.count,
+            'hashes': self.hashes,
+            'size_bytes': len(self.bits),
+        }
+
+
+class BarcodeBloom:
+    """Per-worker Bloom filter over the canonical barcodes in the catalog.
+
+    A barcode the filter does not contain is definitely unknown, as long
+    as no barcode was added since the filter was last brought up to date.
+    The shared keyset generation tells when that happened; the filter then
+    catches up with the products updated since its last catch up. Without a
+    shared cache the generation is per worker, so the filter stays off.
+
+    Requests never wait for a full build: it runs in a background thread
+    while the previous filter, if any, keeps answering.
+    """
+
+    def __init__(self, enabled=True, capacity=100000, error_rate=0.01,
+                 rebuild_interval=6 * 60 * 60, warm_on_startup=False):
+        self.enabled = enabled
+        self.warm_on_startup = warm_on_startup
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self.filter = None
+        self.built_at = None
+        self.caught_up_at = None
+        self.keyset_generation = None
+        self.rebuilding = False
+        self._lock = Lock()
+
+    def _products(self):
+        from .models import Product
+
+        return Product.objects.values_list('gtin', 'barcode')
+
+    def rebuild(self):
+        """Build the filter from every barcode in the catalog and swap it
+        in"""
+        generation = barcode_cache.keyset_generation()
+        caught_up_at = timezone.now()
+        products = self._products()
+        bloom = BloomFilter(
+            max(self.capacity, int(products.count() * 1.25)),
+            self.error_rate
+        )
+        for gtin, barcode in products.iterator():
+            bloom.add(product_key(gtin, barcode))
+
+        with self._lock:
+            self.filter = bloom
+            self.built_at = time.monotonic()
+            self.caught_up_at = caught_up_at
+            self.keyset_generation = generation
+
+    def _run_rebuild(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception('Barcode Bloom filter rebuild failed')
+        finally:
+            self.rebuilding = False
+            connection.close()
+
+    def schedule_rebuild(self):
+        """Rebuild the filter in a background thread, unless a rebuild is
+        running already"""
+        with self._lock:
+            if self.rebuilding:
+                return
+            self.rebuilding = True
+        Thread(target=self._run_rebuild, name='barcode-bloom',
+               daemon=True).start()
+
+    def _catch_up(self, generation):
+        """Add barcodes of products updated since the last catch up"""
+        bloom, since = self.filter, self.caught_up_at
+        caught_up_at = timezone.now()
+        keys = [
+            product_key(gtin, barcode)
+            for gtin, barcode in self._products().filter(
+                updated_at__gte=since - CATCH_UP_SKEW
+            ).iterator()
+        ]
+
+        with self._lock:
+            for key in keys:
+                if key not in bloom:
+                    bloom.add(key)
+            if self.filter is bloom and self.caught_up_at == since:
+                self.caught_up_at = caught_up_at
+                self.keyset_generation = generation
+
+    def add(self, key):
+        """Add a barcode saved by this worker"""
+        bloom = self.filter
+        if bloom is not None and key not in bloom:
+            bloom.add(key)
+
+    def might_contain(self, key):
+        """Return False only for barcodes that are definitely unknown"""
+        if not (self.enabled and barcode_cache.enabled):
+            return True
+        bloom = self.filter
+        if bloom is None:
+            self.schedule_rebuild()
+            return True
+        if time.monotonic() - self.built_at > self.rebuild_interval:
+            self.schedule_rebuild()
+        if key in bloom:
+            return True
+
+        generation = barcode_cache.keyset_generation()
+        if generation != self.keyset_generation:
+            self._catch_up(generation)
+            return key in bloom
+        return False
+
+    def stats(self):
+        stats = {'enabled': self.enabled and barcode_cache.enabled}
+        if self.filter is not None:
+            stats.update(self.filter.stats())
+        return stats
+
+
+barcode_bloom = BarcodeBloom(**{
+    key.lower(): value
+    for key, value in getattr(settings, 'BARCODE_BLOOM', {}).items()
+})
@@ -0,0 +1,168 @@
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from core.cache import LRUCache
+
+
+KEYSET_KEY = 'shop:barcode:keyset'
+
+# Backends whose entries other worker processes cannot see
+LOCAL_BACKENDS = (DummyCache, LocMemCache)
+
+
+def digest(barcode):
+    """Return a cache key safe form of a barcode"""
+    return hashlib.sha1(barcode.encode()).hexdigest()
+
+
+def version_key(key):
+    return f'shop:barcode:version:{digest(key)}'
+
+
+def changed_key(barcode):
+    return f'shop:barcode:changed:{digest(barcode)}'
+
+
+class BarcodeCache:
+    """Cache for serialized barcode lookups.
+
+    An in-process LRU sits in front of a shared cache backend. Entries are
+    stored under per key versions kept in the shared backend, so replacing
+    the version of a key invalidates it in every worker at once.
+
+    That needs a backend shared by the workers. On a process local one
+    both tiers are bypassed, unless single_process says only one process
+    serves requests.
+    """
+
+    def __init__(self, alias='default', max_entries=1024, timeout=300,
+                 single_process=False):
+        self.alias = alias
+        self.single_process = single_process
+        self.timeout = timeout
+        self.local = LRUCache(max_entries)
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    @property
+    def enabled(self):
+        """Return whether invalidations reach every worker"""
+        return self.single_process or \
+            not isinstance(self.shared, LOCAL_BACKENDS)
+
+    def _counter(self, key):
+        value = self.shared.get(key)
+        if value is None:
+            # Seed from the clock so a flushed backend never goes back to a
+            # generation that stale local state was built under
+            self.shared.add(key, int(time.time() * 1000), None)
+            value = self.shared.get(key)
+        return value
+
+    def _bump(self, key):
+        try:
+            self.shared.incr(key)
+        except ValueError:
+            self._counter(key)
+
+    def keyset_generation(self):
+        """Return the generation of the set of known barcodes"""
+        return self._counter(KEYSET_KEY)
+
+    def versions(self, keys):
+        """Return the current version of each key"""
+        names = [version_key(key) for key in keys]
+        found = self.shared.get_many(names)
+        for name in names:
+            if name not in found:
+                # Random so a flushed backend never goes back to a version
+                # that stale local entries were stored under
+                self.shared.add(name, uuid.uuid4().hex, None)
+                found[name] = self.shared.get(name)
+        return tuple(found[name] for name in names)
+
+    def get_or_set(self, barcode, loader, shop=None):
+        """Return the cached payload for barcode, calling loader on a miss.
+
+        Lookups scoped to a shop are invalidated with the barcode and with
+        the shop's membership of it.
+        """
+        if not self.enabled:
+            self.misses += 1
+            return loader()
+
+        key = barcode if shop is None else f'{shop}/{barcode}'
+        versions = self.versions(
+            [barcode] if shop is None else [barcode, key]
+        )
+        entry = self.local.get(key)
+        if entry is not None and entry[0] == versions:
+            self.local_hits += 1
+            return entry[1]
+
+        shared_key = f'shop:barcode:{digest(key)}:{":".join(versions)}'
+        data = self.shared.get(shared_key)
+        if data is None:
+            self.misses += 1
+            data = loader()
+            self.shared.set(shared_key, data, self.timeout)
+        else:
+            self.shared_hits += 1
+
+        self.local.set(key, (versions, data))
+        return data
+
+    def invalidate(self, keys, keyset=False):
+        """Drop the cached payloads of keys, barcodes or shop/barcode
+        pairs. Pass keyset when a barcode was added or changed"""
+        self.shared.set_many(
+            {version_key(key): uuid.uuid4().hex for key in keys}, None
+        )
+        if keyset:
+            self._bump(KEYSET_KEY)
+
+    def mark_changed(self, barcodes, changed_at):
+        """Record changed_at, a timestamp, as the last change of barcodes"""
+        self.shared.set_many(
+            {changed_key(barcode): changed_at for barcode in barcodes},
+            None
+        )
+
+    def changed_since(self, barcode, since):
+        """Return whether barcode changed after the since timestamp.
+
+        Barcodes without a change marker count as unchanged, so a marker
+        evicted from the shared backend goes unnoticed until whatever
+        compared against since, e.g. the barcode index, is rebuilt.
+        """
+        if not self.enabled:
+            return True
+        changed = self.shared.get(changed_key(barcode))
+        return changed is not None and changed > since
+
+    def stats(self):
+        return {
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'size': len(self.local),
+            'max_entries': self.local.maxsize,
+            'enabled': self.enabled,
+        }
+
+
+barcode_cache = BarcodeCache(**{
+    key.lower(): value
+    for key, value in getattr(settings, 'BARCODE_CACHE', {}).items()
+})
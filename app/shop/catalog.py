@@ -0,0 +1,91 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.conf import settings
+
+from .models import Product
+
+
+SCHEMA = (
+    'CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE products ('
+    'barcode TEXT PRIMARY KEY, gtin TEXT, id INTEGER, name TEXT, '
+    'price REAL, is_active INTEGER)',
+    'CREATE INDEX products_gtin ON products (gtin)',
+)
+
+
+def catalog_etag(shop):
+    return f'"{shop.id}-{shop.catalog_version}"'
+
+
+def catalog_pack_path(shop):
+    return os.path.join(
+        settings.CATALOG_PACK_ROOT, str(shop.id),
+        f'{shop.catalog_version}.sqlite.gz'
+    )
+
+
+def pack_version(name):
+    """Return the catalog version of a pack file name, or None"""
+    version = name[:-len('.sqlite.gz')]
+    if name.endswith('.sqlite.gz') and version.isdigit():
+        return int(version)
+    return None
+
+
+def build_catalog_pack(shop):
+    """Return the path of the gzipped SQLite catalog pack of shop at its
+    current catalog version, building it if it does not exist yet.
+
+    The pack holds nothing but the catalog at that version, so every build
+    of a version has the same bytes and ranges of one build can resume a
+    download of another. The previous version is kept for workers still
+    serving it; older ones are removed.
+    """
+    path = catalog_pack_path(shop)
+    if os.path.exists(path):
+        return path
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    products = Product.objects.filter(shop=shop).order_by('barcode')\
+        .values_list('barcode', 'gtin', 'id', 'name', 'price', 'is_active')
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        db_path = os.path.join(tmp, 'catalog.sqlite')
+        db = sqlite3.connect(db_path)
+        with db:
+            for statement in SCHEMA:
+                db.execute(statement)
+            db.executemany('INSERT INTO meta VALUES (?, ?)', (
+                ('shop', str(shop.id)),
+                ('version', str(shop.catalog_version)),
+            ))
+            db.executemany(
+                'INSERT INTO products VALUES (?, ?, ?, ?, ?, ?)',
+                products.iterator()
+            )
+        db.close()
+
+        pack_path = os.path.join(tmp, 'catalog.sqlite.gz')
+        with open(db_path, 'rb') as src, open(pack_path, 'wb') as f, \
+                gzip.GzipFile(filename='', mode='wb', fileobj=f,
+                              mtime=0) as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(pack_path, path)
+
+    versions = sorted(
+        version for version in map(pack_version, os.listdir(directory))
+        if version is not None and version < shop.catalog_version
+    )
+    for version in versions[:-1]:
+        try:
+            os.remove(os.path.join(directory, f'{version}.sqlite.gz'))
+        except FileNotFoundError:
+            pass
+
+    return path
@@ -0,0 +1,69 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import CatalogChange
+
+
+CURSOR_RE = re.compile(r'(?:(\d+)-)?(\d+)')
+
+
+def parse_cursor(value):
+    """Return the (txid, id) position of a feed cursor.
+
+    Plain ids handed out before cursors carried the transaction id are
+    resolved to the position of their row.
+    """
+    match = CURSOR_RE.fullmatch(value)
+    if match is None:
+        raise ValueError('Malformed cursor.')
+    txid, pk = match.groups()
+    if txid is None:
+        txid = CatalogChange.objects.filter(id=pk)\
+            .values_list('txid', flat=True).first() or 0
+    return int(txid), int(pk)
+
+
+def format_cursor(txid, pk):
+    return f'{txid}-{pk}'
+
+
+def visible_filter():
+    """Return a Q of the changes whose position no change committed later
+    can sort before, or None where ids are in commit order.
+
+    On PostgreSQL these are the changes of transactions older than the
+    oldest one still in flight, and those of the current transaction.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT txid_snapshot_xmin(txid_current_snapshot()), '
+            'txid_current_if_assigned()'
+        )
+        horizon, current = cursor.fetchone()
+    visible = Q(txid__lt=horizon)
+    if current is not None:
+        visible |= Q(txid=current)
+    return visible
+
+
+def changes_after(position, limit):
+    """Return up to limit changes after position, in commit order.
+
+    On PostgreSQL, ids are taken in insert order but committed in any
+    order, so the feed runs on the writing transaction id and stops at
+    the oldest transaction still in flight: a change that commits later
+    always sorts after the cursor. SQLite has a single writer at a time,
+    so ids are in commit order there and txid is always 0.
+    """
+    txid, pk = position
+    changes = CatalogChange.objects.filter(
+        Q(txid__gt=txid) | Q(txid=txid, id__gt=pk)
+    )
+    visible = visible_filter()
+    if visible is not None:
+        changes = changes.filter(visible)
+    return list(changes.order_by('txid', 'id')[:limit])
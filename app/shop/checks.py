@@ -0,0 +1,18 @@
+from django.core.checks import Warning, register
+
+from .cache import barcode_cache
+
+
+@register()
+def check_barcode_cache(app_configs, **kwargs):
+    """Warn when barcode lookups cannot be cached across workers"""
+    if barcode_cache.enabled:
+        return []
+    return [Warning(
+        'The barcode cache uses a process local backend, so barcode '
+        'lookups are not cached.',
+        hint='Set CACHE_BACKEND to a shared backend such as Redis or '
+             'Memcached, or BARCODE_CACHE_SINGLE_PROCESS=1 when one '
+             'process serves requests.',
+        id='shop.W001',
+    )]
@@ -0,0 +1,139 @@
+import math
+
+from django.db.models import Q
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+GEOHASH_LENGTH = 12
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_LENGTH):
+    """Return the geohash of a point. Points in the same cell share the
+    cell's geohash as a prefix."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even \
+            else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Return the (latitude, longitude) degrees spanned by a geohash cell"""
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** (bits - bits // 2)
+
+
+def prefix_range(prefix):
+    """Return the [lower, upper) bounds of the geohashes starting with
+    prefix; upper is None past the last cell"""
+    head = prefix
+    while head and head[-1] == BASE32[-1]:
+        head = head[:-1]
+    if not head:
+        return prefix, None
+    return prefix, head[:-1] + BASE32[BASE32.index(head[-1]) + 1]
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Return the great circle distance between two points in km"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius):
+    """Return (min_lat, max_lat, lon_ranges) of the box around the circle
+    of radius km; lon_ranges holds two ranges across the antimeridian"""
+    delta_lat = math.degrees(radius / EARTH_RADIUS_KM)
+    min_lat = max(latitude - delta_lat, -90.0)
+    max_lat = min(latitude + delta_lat, 90.0)
+    if min_lat == -90.0 or max_lat == 90.0:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+
+    delta_lon = math.degrees(math.asin(min(
+        1.0, math.sin(radius / EARTH_RADIUS_KM) /
+        math.cos(math.radians(latitude))
+    )))
+    min_lon = longitude - delta_lon
+    max_lon = longitude + delta_lon
+    if max_lon - min_lon >= 360.0:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    if min_lon < -180.0:
+        return min_lat, max_lat, [(min_lon + 360.0, 180.0),
+                                  (-180.0, max_lon)]
+    if max_lon > 180.0:
+        return min_lat, max_lat, [(min_lon, 180.0),
+                                  (-180.0, max_lon - 360.0)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+def steps(start, stop, size):
+    """Yield the centers of the cells of size covering [start, stop]"""
+    value = math.floor(start / size) * size
+    while value <= stop:
+        yield value + size / 2
+        value += size
+
+
+def covering_cells(min_lat, max_lat, lon_ranges, max_cells=16):
+    """Return the geohash prefixes of the smallest cells of which at most
+    max_cells cover the box"""
+    for precision in range(GEOHASH_LENGTH, 0, -1):
+        lat_size, lon_size = cell_size(precision)
+        count = math.ceil((max_lat - min_lat) / lat_size + 1) * sum(
+            math.ceil((max_lon - min_lon) / lon_size + 1)
+            for min_lon, max_lon in lon_ranges
+        )
+        if count <= max_cells:
+            break
+
+    return sorted({
+        encode_geohash(min(lat, 90.0), min(lon, 180.0), precision)
+        for min_lon, max_lon in lon_ranges
+        for lat in steps(min_lat, max_lat, lat_size)
+        for lon in steps(min_lon, max_lon, lon_size)
+    })
+
+
+def nearby_filter(latitude, longitude, radius, prefix=''):
+    """Return a Q of the rows within the box around the circle of radius
+    km, for the fields of the address at the prefix lookup path.
+
+    The geohash ranges of the covering cells are index range scans; the
+    coordinates then trim the cells to the box. Rows in the corners of
+    the box are left for haversine() to drop.
+    """
+    min_lat, max_lat, lon_ranges = bounding_box(latitude, longitude, radius)
+    cells = Q()
+    for cell in covering_cells(min_lat, max_lat, lon_ranges):
+        lower, upper = prefix_range(cell)
+        bounds = Q(**{f'{prefix}geohash__gte': lower})
+        if upper is not None:
+            bounds &= Q(**{f'{prefix}geohash__lt': upper})
+        cells |= bounds
+
+    longitudes = Q()
+    for min_lon, max_lon in lon_ranges:
+        longitudes |= Q(**{f'{prefix}longitude__range': (min_lon, max_lon)})
+    return cells & longitudes & \
+        Q(**{f'{prefix}latitude__range': (min_lat, max_lat)})
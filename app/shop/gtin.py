@@ -0,0 +1,59 @@
+import re
+
+
+GTIN_LENGTHS = (8, 12, 13, 14)
+
+BARCODE_RE = re.compile(r'[\x21-\x7e]{1,255}')
+
+
+def gtin_check_digit(digits):
+    """Return the GS1 check digit for the digits preceding it"""
+    total = sum(
+        int(digit) * (3 if i % 2 == 0 else 1)
+        for i, digit in enumerate(reversed(digits))
+    )
+    return str((10 - total % 10) % 10)
+
+
+def normalize_gtin(code):
+    """Return code as a zero padded GTIN-14.
+
+    EAN-8, UPC-A, EAN-13 and GTIN-14 representations of an item share the
+    same GTIN-14. Returns None when code is not a GTIN with a valid check
+    digit.
+    """
+    if not (code.isascii() and code.isdigit()):
+        return None
+    if len(code) not in GTIN_LENGTHS:
+        return None
+    if gtin_check_digit(code[:-1]) != code[-1]:
+        return None
+
+    return code.zfill(14)
+
+
+def canonical_barcode(code):
+    """Return the lookup key for a scanned barcode.
+
+    That is its GTIN-14 for GTINs and the code itself for in-store codes.
+    Raises ValueError for codes that cannot be a stored barcode.
+    """
+    if not BARCODE_RE.fullmatch(code):
+        raise ValueError('Malformed barcode.')
+
+    return normalize_gtin(code) or code
+
+
+def product_key(gtin, barcode):
+    """Return the lookup key of a stored product. Legacy duplicates of a
+    GTIN keep a NULL gtin and share the key of the product holding it."""
+    return gtin or normalize_gtin(barcode) or barcode
+
+
+def barcode_filter(code):
+    """Return Product filter kwargs resolving code with one index probe"""
+    key = canonical_barcode(code)
+    if normalize_gtin(key) == key:
+        return {'gtin': key}
+
+    return {'barcode': key}
@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from .models import Product
+
+
+logger = logging.getLogger(__name__)
+
+SAVE_OPTIONS = {
+    'jpeg': {'format': 'JPEG', 'optimize': True, 'progressive': True},
+    'webp': {'format': 'WEBP', 'method': 4},
+    'avif': {'format': 'AVIF'},
+}
+
+_executor = None
+_executor_lock = Lock()
+
+
+def variants_config():
+    return getattr(settings, 'PRODUCT_IMAGE_VARIANTS', {})
+
+
+def supported_formats():
+    """Return the configured variant formats Pillow can encode"""
+    Image.init()
+    return [
+        fmt for fmt in variants_config().get('FORMATS', ('jpeg', 'webp'))
+        if fmt in SAVE_OPTIONS and SAVE_OPTIONS[fmt]['format'] in Image.SAVE
+    ]
+
+
+def variant_name(name, width, fmt):
+    """uploads/product/<name>.jpg -> uploads/product/variants/<name>/96.webp
+    """
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'variants', stem, f'{width}.{fmt}')
+
+
+def replace_file(name, content):
+    """Store content under name, replacing any file there, and return the
+    stored name. Storages without an atomic replace delete the old file
+    first and may pick another name if a concurrent writer wins."""
+    replace = getattr(default_storage, 'replace', None)
+    if replace is not None:
+        return replace(name, content)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, content)
+
+
+def render_variants(name):
+    """Write the resized variants of the stored image name and return them
+    as {format: {width: name}}"""
+    config = variants_config()
+    quality = config.get('QUALITY', 80)
+    with default_storage.open(name, 'rb') as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original.load()
+
+    variants = {}
+    for width in config.get('SIZES', (96, 320, 960)):
+        image = original.copy()
+        image.thumbnail((width, width), Image.LANCZOS)
+        for fmt in supported_formats():
+            converted = image
+            if fmt == 'jpeg' and image.mode != 'RGB':
+                converted = image.convert('RGB')
+            elif image.mode not in ('RGB', 'RGBA'):
+                converted = image.convert('RGBA')
+
+            buffer = BytesIO()
+            converted.save(buffer, quality=quality, **SAVE_OPTIONS[fmt])
+            path = replace_file(
+                variant_name(name, width, fmt),
+                ContentFile(buffer.getvalue())
+            )
+            variants.setdefault(fmt, {})[str(width)] = path
+
+    return variants
+
+
+def generate_image_variants(product_id, name):
+    """Build the variants of a product image and record them, unless the
+    product got another image in the meantime"""
+    variants = render_variants(name)
+    with transaction.atomic():
+        product = Product.objects.select_for_update().filter(
+            pk=product_id, image=name
+        ).first()
+        if product is not None:
+            product.image_variants = json.dumps(variants)
+            product.save(update_fields=['image_variants', 'updated_at'])
+    return variants
+
+
+def run_job(product_id, name):
+    try:
+        generate_image_variants(product_id, name)
+    except Exception:
+        logger.exception('Image variants of product %s failed', product_id)
+    finally:
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=variants_config().get('WORKERS', 2),
+                thread_name_prefix='image-variants'
+            )
+    return _executor
+
+
+def schedule_image_variants(product):
+    """Build the variants of a product's new image in the worker pool once
+    the upload is committed, or right away when ASYNC is off"""
+    if not product.image:
+        return
+    if not variants_config().get('ASYNC', True):
+        generate_image_variants(product.pk, product.image.name)
+        return
+
+    transaction.on_commit(lambda: get_executor().submit(
+        run_job, product.pk, product.image.name
+    ))
+
+
+def image_variant_urls(value, request=None):
+    """Return {format: {width: url}} for an image_variants value"""
+    if not value:
+        return {}
+    urls = {}
+    for fmt, widths in json.loads(value).items():
+        urls[fmt] = {}
+        for width, name in widths.items():
+            url = default_storage.url(name)
+            urls[fmt][width] = request.build_absolute_uri(url) \
+                if request is not None else url
+    return urls
@@ -0,0 +1,161 @@
+import mmap
+import os
+import struct
+import tempfile
+import time
+from threading import Lock
+
+from django.conf import settings
+
+
+MAGIC = b'SBIX'
+VERSION = 2
+
+# magic, version, build time, entry count
+HEADER = struct.Struct('<4sHdI')
+# key offset, record offset; entries are sorted by key
+ENTRY = struct.Struct('<II')
+KEY_LENGTH = struct.Struct('<H')
+# id, price, quantity, is_active, updated_at, name length, barcode length
+RECORD = struct.Struct('<qdq?dHH')
+
+FIELDS = ('id', 'name', 'price', 'quantity', 'is_active', 'barcode')
+
+
+def write_index(path, built_at, rows):
+    """Write a barcode index file.
+
+    rows yields (key, id, name, price, quantity, is_active, barcode,
+    updated_at), updated_at as a timestamp. The file is written next to
+    path and moved into place, so readers never see a partial file.
+    Returns the number of entries.
+    """
+    rows = sorted(
+        ((key.encode(), row) for key, *row in rows),
+        key=lambda item: item[0]
+    )
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, built_at, len(rows)))
+            offset = HEADER.size + ENTRY.size * len(rows)
+            heap = []
+            for key, (pk, name, price, quantity, is_active, barcode,
+                      updated_at) in rows:
+                name = name.encode()
+                barcode = barcode.encode()
+                key_offset = offset
+                record_offset = key_offset + KEY_LENGTH.size + len(key)
+                heap.append(b''.join((
+                    KEY_LENGTH.pack(len(key)), key,
+                    RECORD.pack(pk, price, quantity, is_active, updated_at,
+                                len(name), len(barcode)),
+                    name, barcode,
+                )))
+                f.write(ENTRY.pack(key_offset, record_offset))
+                offset = record_offset + RECORD.size + len(name) + \
+                    len(barcode)
+            f.writelines(heap)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    return len(rows)
+
+
+class BarcodeIndex:
+    """Read-only, memory-mapped barcode index built by build_barcode_index.
+
+    Every worker maps the same file, so the pages are shared through the
+    page cache. The file is re-mapped when it is replaced.
+    """
+
+    def __init__(self, path='', check_interval=5):
+        self.path = path
+        self.check_interval = check_interval
+        self._current = None
+        self._stat = None
+        self._checked_at = 0
+        self._lock = Lock()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                self._current, self._stat = None, None
+                return
+            if self._stat and (stat.st_ino, stat.st_mtime_ns) == self._stat:
+                return
+
+            with open(self.path, 'rb') as f:
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, built_at, count = HEADER.unpack_from(index)
+            if magic != MAGIC or version != VERSION:
+                index.close()
+                return
+            self._current = (index, built_at, count)
+            self._stat = (stat.st_ino, stat.st_mtime_ns)
+
+    def _key(self, index, i):
+        key_offset, record_offset = ENTRY.unpack_from(
+            index, HEADER.size + i * ENTRY.size
+        )
+        length, = KEY_LENGTH.unpack_from(index, key_offset)
+        start = key_offset + KEY_LENGTH.size
+        return index[start:start + length], record_offset
+
+    def lookup(self, key):
+        """Return the updated_at timestamp the record was indexed at and
+        the indexed fields for a canonical barcode, or None"""
+        if not self.path:
+            return None
+        self._refresh()
+        if self._current is None:
+            return None
+
+        index, _, count = self._current
+        key = key.encode()
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            found, record_offset = self._key(index, middle)
+            if found < key:
+                low = middle + 1
+            elif found > key:
+                high = middle
+            else:
+                pk, price, quantity, is_active, updated_at, name_length, \
+                    barcode_length = RECORD.unpack_from(index, record_offset)
+                start = record_offset + RECORD.size
+                name = index[start:start + name_length].decode()
+                start += name_length
+                barcode = index[start:start + barcode_length].decode()
+                return updated_at, dict(zip(FIELDS, (
+                    pk, name, price, quantity, is_active, barcode
+                )))
+        return None
+
+    def stats(self):
+        if self.path:
+            self._refresh()
+        index, built_at, count = self._current or (b'', None, 0)
+        return {
+            'path': self.path,
+            'built_at': built_at,
+            'entries': count,
+            'size_bytes': len(index),
+        }
+
+
+barcode_index = BarcodeIndex(**{
+    key.lower(): value
+    for key, value in getattr(settings, 'BARCODE_INDEX', {}).items()
+})
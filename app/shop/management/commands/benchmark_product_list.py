@@ -0,0 +1,100 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.middleware import brotli, compress
+from core.renderers import ORJSONRenderer, orjson
+from shop.models import Product
+from shop.pagination import ProductPagination
+from shop.views import ProductViewSet
+
+
+class Rollback(Exception):
+    """Raised to roll back the sample data"""
+
+
+class Command(BaseCommand):
+    """Django command to measure the CPU time and size of product list
+    responses with each JSON renderer and content coding"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products', type=int, default=1000,
+            help='Sample products to create, rolled back afterwards'
+        )
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--level', type=int, default=6,
+                            help='Compression level')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.benchmark(**options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def benchmark(self, products, page_size, iterations, level, **options):
+        user = get_user_model().objects.create_user(
+            email='benchmark@localhost'
+        )
+        Product.objects.bulk_create(
+            Product(user=user, name=f'Sample product {i}',
+                    description='Sample product description ' * 4,
+                    quantity=i % 100, price=i / 100,
+                    barcode=f'BENCH{i:08}')
+            for i in range(products)
+        )
+        pagination = type('Pagination', (ProductPagination,),
+                          {'page_size': page_size})
+
+        if orjson is None:
+            self.stdout.write('orjson is not installed: ORJSONRenderer '
+                              'falls back to JSONRenderer.')
+        content = None
+        for renderer in (JSONRenderer, ORJSONRenderer):
+            view = ProductViewSet.as_view(
+                {'get': 'list'}, renderer_classes=[renderer],
+                pagination_class=pagination
+            )
+            request_time = self.measure(
+                lambda: self.get(view, user), iterations
+            )
+            response = self.get(view, user)
+            render_time = self.measure(
+                lambda: renderer().render(response.data), iterations
+            )
+            content = response.content
+            self.stdout.write(
+                f'{renderer.__name__}: {request_time:.2f} ms per request, '
+                f'{render_time:.2f} ms rendering, {len(content)} bytes'
+            )
+
+        codings = ('gzip', 'br') if brotli is not None else ('gzip',)
+        for coding in codings:
+            compress_time = self.measure(
+                lambda: compress(coding, content, level), iterations
+            )
+            size = len(compress(coding, content, level))
+            self.stdout.write(
+                f'{coding}: {compress_time:.2f} ms, {size} bytes '
+                f'({100 * size / len(content):.0f}%)'
+            )
+
+    def get(self, view, user):
+        request = APIRequestFactory().get('/api/shop/products/')
+        force_authenticate(request, user)
+        return view(request).render()
+
+    def measure(self, function, iterations):
+        """Return the mean CPU time of function in milliseconds"""
+        start = time.process_time()
+        for _ in range(iterations):
+            function()
+        return (time.process_time() - start) * 1000 / iterations
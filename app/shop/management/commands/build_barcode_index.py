@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.gtin import product_key
+from shop.index import barcode_index, write_index
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    """Django command to compile the memory-mapped barcode index"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=barcode_index.path,
+            help='Index file to write, defaults to BARCODE_INDEX["PATH"]'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not path:
+            self.stderr.write('No index path configured.')
+            return
+
+        # Keyed like lookups; the product holding a GTIN wins over legacy
+        # duplicates of it, which keep a NULL gtin
+        products = Product.objects.order_by('id').values_list(
+            'gtin', 'barcode', 'id', 'name', 'price', 'quantity',
+            'is_active', 'updated_at'
+        )
+        rows = {}
+        for gtin, barcode, pk, name, price, quantity, is_active, \
+                updated_at in products.iterator():
+            key = product_key(gtin, barcode)
+            if key not in rows or gtin:
+                rows[key] = (key, pk, name, price, quantity, is_active,
+                             barcode, updated_at.timestamp())
+        count = write_index(path, time.time(), rows.values())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {count} barcodes into {path}'
+        ))
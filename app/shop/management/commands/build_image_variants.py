@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from shop.images import generate_image_variants, variants_config
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    """Django command to build the resized variants of product images"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=variants_config().get('WORKERS', 2)
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Rebuild the variants of images that already have them'
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image=None)
+        if not options['all']:
+            products = products.filter(image_variants='')
+        jobs = list(products.values_list('id', 'image'))
+
+        def build(job):
+            try:
+                generate_image_variants(*job)
+                return True
+            except Exception as exc:
+                self.stderr.write(f'Product {job[0]}: {exc}')
+                return False
+
+        def build_in_thread(job):
+            try:
+                return build(job)
+            finally:
+                connection.close()
+
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(options['workers']) as executor:
+                built = sum(executor.map(build_in_thread, jobs))
+        else:
+            built = sum(map(build, jobs))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Built image variants for {built} of {len(jobs)} products'
+        ))
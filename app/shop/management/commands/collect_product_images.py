@@ -0,0 +1,107 @@
+import json
+import os
+import time
+from functools import reduce
+from operator import or_
+
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.core.management.base import BaseCommand
+
+from shop.models import PRODUCT_IMAGE_ROOT, Product
+
+
+def walk(storage, path):
+    """Yield the names of the files under path"""
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield os.path.join(path, name)
+    for directory in directories:
+        yield from walk(storage, os.path.join(path, directory))
+
+
+def referenced_names(names):
+    """Return the names still referenced by a product image or variant.
+
+    Content addressed images are shared between products: a file is
+    garbage only once no product row refers to it.
+    """
+    names = set(names)
+    referenced = set(
+        Product.objects.filter(image__in=names)
+        .values_list('image', flat=True)
+    )
+    variants = [name for name in names if '/variants/' in name]
+    if variants:
+        rows = Product.objects.filter(reduce(or_, (
+            Q(image_variants__contains=f'"{name}"') for name in variants
+        ))).values_list('image_variants', flat=True)
+        for row in rows:
+            for widths in json.loads(row).values():
+                referenced.update(names.intersection(widths.values()))
+    return referenced
+
+
+class Command(BaseCommand):
+    """Django command to delete product images and variants that no
+    product refers to any more"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=24 * 60 * 60,
+            help='Keep files modified in the last GRACE seconds, as they '
+                 'may belong to uploads not committed yet'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if not default_storage.exists(PRODUCT_IMAGE_ROOT):
+            self.stdout.write('No product images stored.')
+            return
+
+        # Mark
+        referenced = set()
+        products = Product.objects.exclude(image='').exclude(image=None)
+        for image, variants in products.values_list(
+                'image', 'image_variants').iterator():
+            referenced.add(image)
+            for widths in json.loads(variants or '{}').values():
+                referenced.update(widths.values())
+
+        # Sweep, checking every batch again against the database
+        cutoff = time.time() - options['grace']
+        candidates = (
+            name for name in walk(default_storage, PRODUCT_IMAGE_ROOT)
+            if name not in referenced and
+            default_storage.get_modified_time(name).timestamp() < cutoff
+        )
+        deleted = size = 0
+        batch = []
+        for name in candidates:
+            batch.append(name)
+            if len(batch) >= options['batch_size']:
+                deleted, size = self.sweep(batch, deleted, size, options)
+                batch = []
+        deleted, size = self.sweep(batch, deleted, size, options)
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {deleted} unreferenced files ({size} bytes)'
+        ))
+
+    def sweep(self, batch, deleted, size, options):
+        garbage = set(batch) - referenced_names(batch)
+        for name in sorted(garbage):
+            size += default_storage.size(name)
+            deleted += 1
+            if not options['dry_run']:
+                default_storage.delete(name)
+                self.remove_empty_directory(os.path.dirname(name))
+        return deleted, size
+
+    def remove_empty_directory(self, path):
+        try:
+            os.rmdir(default_storage.path(path))
+        except (NotImplementedError, OSError):
+            pass
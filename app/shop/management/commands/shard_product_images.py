@@ -0,0 +1,99 @@
+import json
+import os
+import re
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop.cache import barcode_cache
+from shop.gtin import product_key
+from shop.images import variant_name
+from shop.models import PRODUCT_IMAGE_ROOT, CatalogChange, Product, \
+    sharded_path
+
+
+SHARDED_RE = re.compile(rf'^{PRODUCT_IMAGE_ROOT}/[^/]{{2}}/[^/]{{2}}/[^/]+$')
+
+
+def copy(name, new_name):
+    """Copy a stored file, unless an earlier run already did"""
+    if default_storage.exists(new_name):
+        if default_storage.size(new_name) == default_storage.size(name):
+            return
+        default_storage.delete(new_name)
+    with default_storage.open(name, 'rb') as f:
+        default_storage.save(new_name, f)
+
+
+class Command(BaseCommand):
+    """Django command to move product images to the sharded layout.
+
+    Files are copied and the rows then pointed at the copies, so stored
+    URLs keep working throughout; the old files are left to
+    collect_product_images. Rows already moved are skipped, so the
+    command can be stopped and run again.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to pause between batches')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image=None)\
+            .order_by('id')
+        last_id = moved = 0
+        while True:
+            batch = list(
+                products.filter(id__gt=last_id)
+                .values_list('id', 'image', 'image_variants')
+                [:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            changed = [pk for pk, name, variants in batch
+                       if not SHARDED_RE.match(name) and
+                       self.move(pk, name, variants)]
+            if changed:
+                CatalogChange.objects.bulk_create(
+                    CatalogChange(product_id=pk) for pk in changed
+                )
+                barcode_cache.invalidate(
+                    product_key(gtin, barcode)
+                    for gtin, barcode in Product.objects.filter(
+                        pk__in=changed
+                    ).values_list('gtin', 'barcode')
+                )
+                moved += len(changed)
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved the images of {moved} products'
+        ))
+
+    def move(self, pk, name, variants):
+        if not default_storage.exists(name):
+            self.stderr.write(f'Product {pk}: {name} does not exist')
+            return False
+
+        new_name = sharded_path(PRODUCT_IMAGE_ROOT, os.path.basename(name))
+        copy(name, new_name)
+        new_variants = {}
+        for fmt, widths in json.loads(variants or '{}').items():
+            for width, variant in widths.items():
+                if not default_storage.exists(variant):
+                    continue
+                new_variant = variant_name(new_name, width, fmt)
+                copy(variant, new_variant)
+                new_variants.setdefault(fmt, {})[width] = new_variant
+
+        # Only if the product did not get a new image in the meantime
+        return Product.objects.filter(pk=pk, image=name).update(
+            image=new_name,
+            image_variants=json.dumps(new_variants) if new_variants else '',
+            updated_at=timezone.now()
+        ) > 0
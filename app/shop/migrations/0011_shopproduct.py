@@ -0,0 +1,38 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """Turn the auto-created Shop.products table into an explicit model.
+
+    The table, columns and (shop_id, product_id) unique constraint already
+    exist, so only the migration state changes.
+    """
+
+    dependencies = [
+        ('shop', '0010_auto_20200627_0905'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ShopProduct',
+                    fields=[
+                        ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.Product')),
+                        ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shop.Shop')),
+                    ],
+                    options={
+                        'db_table': 'shop_shop_products',
+                        'unique_together': {('shop', 'product')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='shop',
+                    name='products',
+                    field=models.ManyToManyField(through='shop.ShopProduct', to='shop.Product'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:44
+
+from django.db import migrations, models
+
+from shop.gtin import normalize_gtin
+
+
+def populate_gtin(apps, schema_editor):
+    """Normalize existing barcodes. When several legacy barcodes are the
+    same GTIN, only the first one gets it. The rest keep a NULL gtin, which
+    Product.save leaves alone, and lookups of the GTIN fall back to their
+    exact barcode when no product holds it."""
+    Product = apps.get_model('shop', 'Product')
+    seen = set()
+    for product in Product.objects.order_by('id').only('id', 'barcode'):
+        gtin = normalize_gtin(product.barcode)
+        if gtin and gtin not in seen:
+            seen.add(gtin)
+            Product.objects.filter(pk=product.pk).update(gtin=gtin)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_shopproduct'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='gtin',
+            field=models.CharField(editable=False, max_length=14, null=True, unique=True),
+        ),
+        migrations.RunPython(populate_gtin, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_product_gtin'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 3.0.14 on 2026-10-18 08:55
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+POSTGRES_FORWARDS = (
+    """
+    CREATE FUNCTION shop_product_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.barcode, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(NEW.description, '')),
+                      'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER shop_product_search_vector_update
+    BEFORE INSERT OR UPDATE OF name, description, barcode ON shop_product
+    FOR EACH ROW EXECUTE PROCEDURE shop_product_search_vector()
+    """,
+    'UPDATE shop_product SET name = name',
+    'CREATE INDEX shop_product_search_vector_idx ON shop_product '
+    'USING gin (search_vector)',
+    'CREATE INDEX shop_product_name_trgm_idx ON shop_product '
+    'USING gin (name gin_trgm_ops)',
+)
+POSTGRES_BACKWARDS = (
+    'DROP INDEX IF EXISTS shop_product_name_trgm_idx',
+    'DROP INDEX IF EXISTS shop_product_search_vector_idx',
+    'DROP TRIGGER IF EXISTS shop_product_search_vector_update '
+    'ON shop_product',
+    'DROP FUNCTION IF EXISTS shop_product_search_vector()',
+)
+SQLITE_FORWARDS = (
+    'CREATE VIRTUAL TABLE shop_product_fts '
+    'USING fts5(name, description, barcode)',
+    'INSERT INTO shop_product_fts (rowid, name, description, barcode) '
+    'SELECT id, name, description, barcode FROM shop_product',
+)
+SQLITE_BACKWARDS = (
+    'DROP TABLE IF EXISTS shop_product_fts',
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_product_created_id_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_FORWARDS,
+                 'sqlite': SQLITE_FORWARDS}),
+            run({'postgresql': POSTGRES_BACKWARDS,
+                 'sqlite': SQLITE_BACKWARDS}),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0020_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shopproduct',
+            name='quantity',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='shopproduct',
+            index=models.Index(condition=models.Q(quantity__lte=10), fields=['shop', 'quantity'], name='shopproduct_low_stock_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='shopproduct',
+            constraint=models.CheckConstraint(check=models.Q(quantity__gte=0), name='shopproduct_quantity_gte_0'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:25
+
+from django.db import migrations, models
+
+
+POSTGRES_FORWARDS = (
+    """
+    CREATE FUNCTION shop_catalogchange_txid() RETURNS trigger AS $$
+    BEGIN
+        NEW.txid := txid_current();
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER shop_catalogchange_txid_insert
+    BEFORE INSERT ON shop_catalogchange
+    FOR EACH ROW EXECUTE PROCEDURE shop_catalogchange_txid()
+    """,
+)
+POSTGRES_BACKWARDS = (
+    'DROP TRIGGER IF EXISTS shop_catalogchange_txid_insert '
+    'ON shop_catalogchange',
+    'DROP FUNCTION IF EXISTS shop_catalogchange_txid()',
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0022_address_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogchange',
+            name='txid',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='catalogchange',
+            index=models.Index(fields=['txid', 'id'], name='catalogchange_txid_idx'),
+        ),
+        migrations.RunPython(run(POSTGRES_FORWARDS),
+                             run(POSTGRES_BACKWARDS)),
+    ]
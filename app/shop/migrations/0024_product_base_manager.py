@@ -0,0 +1,17 @@
+# Generated by Django 3.0.14 on 2026-10-18 09:36
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0023_catalogchange_txid'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='product',
+            options={'base_manager_name': 'objects', 'verbose_name_plural': 'Shop Products'},
+        ),
+    ]
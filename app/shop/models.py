@@ -1,16 +1,50 @@
+import hashlib
 import uuid
 import os
 
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
+
+from .geo import GEOHASH_LENGTH, encode_geohash
+from .gtin import normalize_gtin
+
+
+PRODUCT_IMAGE_ROOT = 'uploads/product'
+# Highest stock level the low stock index covers
+LOW_STOCK_THRESHOLD = 10
+
+
+def content_digest(file):
+    sha256 = hashlib.sha256()
+    for chunk in file.chunks():
+        sha256.update(chunk)
+    file.seek(0)
+    return sha256.hexdigest()
+
+
+def sharded_path(directory, filename):
+    """Spread files over directory/ab/cd/ by the first characters of their
+    (random or hashed) name"""
+    stem = os.path.splitext(filename)[0].lower()
+    if len(stem) < 4:
+        stem = hashlib.md5(filename.encode()).hexdigest()
+
+    return os.path.join(directory, stem[:2], stem[2:4], filename)
 
 
 def product_image_file_path(instance, filename):
-    """Generate file path for new product image"""
-    ext = filename.split('.')[-1]
-    filename = f'{uuid.uuid4()}.{ext}'
+    """Generate file path for new product image, named after the SHA-256
+    of its content so identical images are stored once"""
+    ext = filename.split('.')[-1].lower()
+    image = getattr(instance, 'image', None)
+    if image and not image._committed:
+        filename = f'{content_digest(image.file)}.{ext}'
+    else:
+        filename = f'{uuid.uuid4()}.{ext}'
 
-    return os.path.join('uploads/product/', filename)
+    return sharded_path(PRODUCT_IMAGE_ROOT, filename)
 
 
 class Shop(models.Model):
@@ -23,37 +57,155 @@ class Shop(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
-    products = models.ManyToManyField('Product')
+    products = models.ManyToManyField('Product', through='ShopProduct')
     address = models.ForeignKey(
         'Address',
         on_delete=models.PROTECT
     )
+    catalog_version = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
 
+class ProductManager(models.Manager):
+    """Leave out search_vector, which is only filtered and ranked on"""
+
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector')
+
+
 class Product(models.Model):
     class Meta:
         verbose_name_plural = "Shop Products"
+        # Related object access loads products without search_vector too
+        base_manager_name = 'objects'
+        indexes = [
+            # Keyset pagination order
+            models.Index(fields=['-created_at', '-id'],
+                         name='product_created_id_idx'),
+            # List filters
+            models.Index(fields=['-created_at', '-id'],
+                         condition=models.Q(is_active=True),
+                         name='product_active_created_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+            models.Index(fields=['quantity'], name='product_quantity_idx'),
+        ]
 
     name = models.CharField(max_length=255)
     description = models.TextField()
     quantity = models.IntegerField()
     price = models.FloatField()
     barcode = models.CharField(max_length=255, unique=True)
+    gtin = models.CharField(max_length=14, unique=True, null=True,
+                            editable=False)
     is_active = models.BooleanField(default=True)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
     image = models.ImageField(null=True, upload_to=product_image_file_path)
+    # JSON {format: {width: name}} written by shop.images
+    image_variants = models.TextField(blank=True, default='', editable=False)
     created_at = models.DateField(auto_now_add=True)
-    updated_at = models.DateField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Maintained by a database trigger on PostgreSQL, see shop.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductManager()
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the stored barcode to tell when it changes"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_barcode = instance.__dict__.get('barcode')
+        return instance
+
+    def clean(self):
+        """Reject barcodes that are another representation of a GTIN
+        already in the catalog"""
+        gtin = normalize_gtin(self.barcode)
+        duplicates = Product.objects.filter(gtin=gtin).exclude(pk=self.pk)
+        if gtin and duplicates.exists():
+            raise ValidationError(
+                {'barcode': 'Product with this GTIN already exists.'}
+            )
+
+    def save(self, *args, **kwargs):
+        """Store the canonical GTIN-14 alongside the scanned barcode.
+
+        The gtin is only set for new or changed barcodes, so legacy
+        duplicates of a GTIN keep their NULL gtin, see migration 0012.
+        """
+        loaded = getattr(self, '_loaded_barcode', None)
+        if self._state.adding or loaded is None or self.barcode != loaded:
+            self.gtin = normalize_gtin(self.barcode)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'barcode' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'gtin'}
+
+        super().save(*args, **kwargs)
+        self._loaded_barcode = self.barcode
+
+
+class ShopProduct(models.Model):
+    """Products carried by a shop and the shop's stock of them.
+
+    Keeps the table of the former auto-created through model. The
+    (shop, product) unique constraint is the composite index used to
+    resolve a barcode within a shop.
+    """
+
+    class Meta:
+        db_table = 'shop_shop_products'
+        unique_together = ('shop', 'product')
+        constraints = [
+            models.CheckConstraint(check=models.Q(quantity__gte=0),
+                                   name='shopproduct_quantity_gte_0'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['shop', 'quantity'],
+                condition=models.Q(quantity__lte=LOW_STOCK_THRESHOLD),
+                name='shopproduct_low_stock_idx'
+            ),
+        ]
+
+    shop = models.ForeignKey('Shop', on_delete=models.CASCADE)
+    product = models.ForeignKey('Product', on_delete=models.CASCADE)
+    quantity = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.shop_id}:{self.product_id}'
+
+
+class CatalogChange(models.Model):
+    """Change log behind the product change feed.
+
+    One row per product change, or per shop membership change when shop_id
+    is set. The feed runs in (txid, id) order, see shop.changes. Product
+    and shop are plain ids so tombstones outlive the rows they describe.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['txid', 'id'], name='catalogchange_txid_idx'),
+        ]
+
+    # Writing transaction, set by a database trigger on PostgreSQL
+    txid = models.BigIntegerField(default=0, editable=False)
+    product_id = models.IntegerField()
+    shop_id = models.IntegerField(null=True)
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return str(self.id)
+
 
 class Address(models.Model):
     class Meta:
@@ -70,6 +222,25 @@ class Address(models.Model):
     city = models.CharField(max_length=255)
     street = models.CharField(max_length=255)
     number = models.CharField(max_length=255)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # Spatial index of the coordinates, see shop.geo
+    geohash = models.CharField(max_length=GEOHASH_LENGTH, null=True,
+                               editable=False, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.city
+
+    def save(self, *args, **kwargs):
+        """Keep the geohash in step with the coordinates"""
+        if self.latitude is None or self.longitude is None:
+            self.geohash = None
+        else:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and \
+                {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+
+        super().save(*args, **kwargs)
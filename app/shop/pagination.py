@@ -0,0 +1,105 @@
+import base64
+import datetime
+from collections import OrderedDict
+
+from django.db.models import Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+
+from core.mixins import row_value
+
+
+class KeysetPagination(BasePagination):
+    """Forward only cursor pagination on a unique (created_at, id) order.
+
+    Every page is a single indexed range scan: no COUNT(*) and no OFFSET,
+    so deep pages cost the same as the first one.
+    """
+
+    page_size = 10
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    ordering = ('-created_at', '-id')
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            created_at, pk = base64.urlsafe_b64decode(
+                cursor.encode()
+            ).decode().split('|')
+            return datetime.date.fromisoformat(created_at), int(pk)
+        except (ValueError, TypeError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row):
+        created_at = row_value(row, 'created_at')
+        position = f'{created_at.isoformat()}|{row_value(row, "pk")}'
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            created_at, pk = position
+            queryset = queryset.filter(created_at__lte=created_at).filter(
+                Q(created_at__lt=created_at) | Q(id__lt=pk)
+            )
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        params = self.request.query_params.copy()
+        params[self.cursor_query_param] = self.encode_cursor(self.page[-1])
+        return self.request.build_absolute_uri(
+            f'{self.request.path}?{params.urlencode()}'
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class ProductPagination(PageNumberPagination):
+    """Page number pagination, or keyset pagination for requests passing
+    ?cursor= (empty for the first page).
+
+    Keyset pages are always newest first: with ?q= they hold every match
+    but not ranked, as the rank is no stable cursor position. Use ?page=
+    for ranked search results.
+    """
+
+    page_size = 10
+    ordering = KeysetPagination.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            self.keyset.page_size = self.page_size
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+
+class StockPagination(PageNumberPagination):
+    """Page number pagination for shop stock lists"""
+
+    page_size = 50
@@ -0,0 +1,86 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, \
+    TrigramSimilarity
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+
+SEARCH_CONFIG = 'simple'
+FTS_TABLE = 'shop_product_fts'
+# FTS5 bm25 weights of the name, description and barcode columns
+FTS_WEIGHTS = (10.0, 1.0, 10.0)
+TERM_RE = re.compile(r'\w+')
+MAX_TERMS = 8
+
+
+def search_terms(text):
+    return TERM_RE.findall(text.lower())[:MAX_TERMS]
+
+
+def postgres_search(queryset, terms, text):
+    """Rank on the search_vector GIN index, prefix matching every term,
+    plus fuzzy name matches from the trigram index"""
+    query = SearchQuery(
+        ' & '.join(f'{term}:*' for term in terms),
+        config=SEARCH_CONFIG, search_type='raw'
+    )
+    return queryset.annotate(
+        rank=SearchRank(F('search_vector'), query),
+        similarity=TrigramSimilarity('name', text),
+    ).filter(
+        Q(search_vector=query) | Q(name__trigram_similar=text)
+    ).order_by('-rank', '-similarity', '-id')
+
+
+def sqlite_search(queryset, terms):
+    """Rank on the FTS5 table kept in sync by index_product"""
+    match = ' '.join(f'"{term}"*' for term in terms)
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    return queryset.filter(id__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (match,)
+    )).annotate(rank=RawSQL(
+        f'SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = shop_product.id',
+        (match,)
+    )).order_by('rank', '-id')
+
+
+def search_products(queryset, text):
+    """Filter a Product queryset on text, best matches first"""
+    terms = search_terms(text)
+    if not terms:
+        return queryset.none()
+    if connection.vendor == 'postgresql':
+        return postgres_search(queryset, terms, text)
+    if connection.vendor == 'sqlite':
+        return sqlite_search(queryset, terms)
+
+    query = Q()
+    for term in terms:
+        query &= Q(name__icontains=term) | Q(barcode__icontains=term)
+    return queryset.filter(query)
+
+
+def index_product(product):
+    """Update the SQLite FTS5 row of product. On PostgreSQL the
+    search_vector column is maintained by a trigger."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                       [product.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description, barcode) '
+            f'VALUES (%s, %s, %s, %s)',
+            [product.pk, product.name, product.description, product.barcode]
+        )
+
+
+def unindex_product(pk):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
@@ -1,44 +1,264 @@
+from collections import Counter
+from collections.abc import Mapping
+
+from django.conf import settings
+from django.db.models import Q
+
 from rest_framework import serializers
 
-from .models import Shop, Product, Address
+from core.serializers import SparseFieldsSerializerMixin
+
+from .gtin import BARCODE_RE, barcode_filter, canonical_barcode, \
+    normalize_gtin
+from .images import image_variant_urls
+from .models import Shop, Product, ShopProduct, Address
+
+
+class ImageVariantsField(serializers.Field):
+    """Map of the resized image variants URLs by format and width"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        """Plain dicts without variants get an empty map too"""
+        if isinstance(instance, Mapping):
+            return instance.get(self.source, '')
+        return super().get_attribute(instance)
 
+    def to_representation(self, value):
+        return image_variant_urls(value, self.context.get('request'))
 
-class ShopSerializer(serializers.ModelSerializer):
+
+class ShopSerializer(SparseFieldsSerializerMixin,
+                     serializers.ModelSerializer):
     """Serializer for shop objects"""
 
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
     products = serializers.PrimaryKeyRelatedField(
         many=True,
-        queryset=Product.objects.all()
+        queryset=Product.objects.all(),
+        write_only=True
     )
+    products_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Shop
-        fields = ('id', 'user', 'name', 'is_active', 'products', 'address')
+        fields = ('id', 'user', 'name', 'is_active', 'products',
+                  'products_count', 'address')
         read_only_fields = ('id',)
 
+    def get_products_count(self, obj):
+        """Use the count annotated by ShopViewSet when there is one"""
+        count = getattr(obj, 'products_count', None)
+        return obj.products.count() if count is None else count
+
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsSerializerMixin,
+                        serializers.ModelSerializer):
     """Serializer for product objects"""
 
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    srcset = ImageVariantsField(source='image_variants')
 
     class Meta:
         model = Product
         fields = ('id', 'user', 'name', 'description', 'quantity', 'price',
-                  'barcode', 'is_active', 'image', 'updated_at', 'created_at')
+                  'barcode', 'is_active', 'image', 'srcset', 'updated_at',
+                  'created_at')
         read_only_fields = ('id',)
 
+    def validate_barcode(self, value):
+        """Reject malformed barcodes and other representations of a GTIN
+        already in the catalog"""
+        if not BARCODE_RE.fullmatch(value):
+            raise serializers.ValidationError('Malformed barcode.')
+
+        gtin = normalize_gtin(value)
+        duplicates = Product.objects.filter(gtin=gtin)
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if gtin and duplicates.exists():
+            raise serializers.ValidationError(
+                'Product with this GTIN already exists.'
+            )
+
+        return value
+
 
 class ProductImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to products"""
 
+    srcset = ImageVariantsField(source='image_variants')
+
     class Meta:
         model = Product
-        fields = ('id', 'image')
+        fields = ('id', 'image', 'srcset')
         read_only_fields = ('id',)
 
 
+class BarcodeListSerializer(serializers.Serializer):
+    """Serializer for batch barcode lookups"""
+
+    barcodes = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        allow_empty=False,
+        max_length=settings.BARCODE_BATCH_MAX_SIZE
+    )
+
+
+class ShopStockSerializer(serializers.ModelSerializer):
+    """Serializer for a shop's stock of a product"""
+
+    product = ProductSerializer(read_only=True)
+
+    class Meta:
+        model = ShopProduct
+        fields = ('product', 'quantity')
+        read_only_fields = ('quantity',)
+
+
+class RestockItemSerializer(serializers.Serializer):
+    """Serializer for a quantity of a product to add to a shop's stock"""
+
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class RestockSerializer(serializers.Serializer):
+    """Serializer for adding stock of products a shop carries"""
+
+    items = RestockItemSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, value):
+        if len(value) > settings.SHOP_PRODUCTS_BATCH_MAX_SIZE:
+            raise serializers.ValidationError(
+                'Ensure this field has no more than '
+                f'{settings.SHOP_PRODUCTS_BATCH_MAX_SIZE} elements.'
+            )
+        return value
+
+    def validate(self, data):
+        """Sum the quantities by product"""
+        quantities = Counter()
+        for item in data['items']:
+            quantities[item['product']] += item['quantity']
+        data['quantities'] = quantities
+        return data
+
+
+class ShopProductsSerializer(serializers.Serializer):
+    """Serializer for adding products to or removing them from a shop, by
+    id or barcode"""
+
+    products = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=settings.SHOP_PRODUCTS_BATCH_MAX_SIZE
+    )
+    barcodes = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        required=False,
+        max_length=settings.SHOP_PRODUCTS_BATCH_MAX_SIZE
+    )
+
+    def validate_barcodes(self, value):
+        keys = {}
+        for code in value:
+            try:
+                keys[code] = canonical_barcode(code)
+            except ValueError:
+                raise serializers.ValidationError(
+                    f'Malformed barcode: {code}.'
+                )
+        return keys
+
+    def validate(self, data):
+        """Resolve the ids and barcodes to product ids in one query"""
+        ids = set(data.get('products', ()))
+        keys = data.get('barcodes', {})
+        if not ids and not keys:
+            raise serializers.ValidationError(
+                'Give a list of products or barcodes.'
+            )
+
+        lookups = [barcode_filter(key) for key in set(keys.values())]
+        rows = Product.objects.filter(
+            Q(id__in=ids) |
+            Q(gtin__in=[lookup['gtin'] for lookup in lookups
+                        if 'gtin' in lookup]) |
+            Q(barcode__in=[lookup['barcode'] for lookup in lookups
+                           if 'barcode' in lookup])
+        ).values_list('id', 'gtin', 'barcode')
+
+        found_ids = set()
+        found_keys = set()
+        for pk, gtin, barcode in rows:
+            found_ids.add(pk)
+            found_keys.add(gtin or barcode)
+
+        errors = {}
+        missing = sorted(ids - found_ids)
+        if missing:
+            errors['products'] = [
+                f'Unknown products: {", ".join(map(str, missing))}.'
+            ]
+        missing = [code for code, key in keys.items()
+                   if key not in found_keys]
+        if missing:
+            errors['barcodes'] = [f'Unknown barcodes: {", ".join(missing)}.']
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        data['product_ids'] = found_ids
+        return data
+
+
+class ProductFilterSerializer(serializers.Serializer):
+    """Serializer for product list query parameters"""
+
+    LOOKUPS = {
+        'is_active': 'is_active',
+        'price_min': 'price__gte',
+        'price_max': 'price__lte',
+        'quantity_min': 'quantity__gte',
+        'quantity_max': 'quantity__lte',
+        'shop': 'shop',
+        'updated_after': 'updated_at__gte',
+        'updated_before': 'updated_at__lt',
+    }
+
+    is_active = serializers.BooleanField(required=False)
+    price_min = serializers.FloatField(required=False)
+    price_max = serializers.FloatField(required=False)
+    quantity_min = serializers.IntegerField(required=False)
+    quantity_max = serializers.IntegerField(required=False)
+    shop = serializers.IntegerField(required=False)
+    updated_after = serializers.DateTimeField(required=False)
+    updated_before = serializers.DateTimeField(required=False)
+
+    def get_lookups(self):
+        """Return Product filter kwargs for the validated parameters"""
+        return {
+            self.LOOKUPS[name]: value
+            for name, value in self.validated_data.items()
+        }
+
+
+class NearbySerializer(serializers.Serializer):
+    """Serializer for nearby shop query parameters, radius in km"""
+
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lon = serializers.FloatField(min_value=-180, max_value=180)
+    radius = serializers.FloatField(
+        min_value=0, max_value=settings.SHOP_NEARBY_MAX_RADIUS, default=5
+    )
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.SHOP_NEARBY_MAX_RESULTS, default=20
+    )
+
+
 class AddressSerializer(serializers.ModelSerializer):
     """Serializer for Address object"""
 
@@ -47,5 +267,22 @@ class AddressSerializer(serializers.ModelSerializer):
     class Meta:
         model = Address
         fields = ('id', 'user', 'country', 'postcode',
-                  'region', 'city', 'street', 'number')
+                  'region', 'city', 'street', 'number', 'latitude',
+                  'longitude')
         read_only_fields = ('id',)
+        extra_kwargs = {
+            'latitude': {'min_value': -90, 'max_value': 90},
+            'longitude': {'min_value': -180, 'max_value': 180},
+        }
+
+    def validate(self, data):
+        """Coordinates come in pairs"""
+        latitude = data.get('latitude', getattr(self.instance, 'latitude',
+                                                None))
+        longitude = data.get('longitude', getattr(self.instance,
+                                                  'longitude', None))
+        if (latitude is None) != (longitude is None):
+            raise serializers.ValidationError(
+                'Give both latitude and longitude, or neither.'
+            )
+        return data
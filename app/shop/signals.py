@@ -0,0 +1,136 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, \
+    pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .bloom import barcode_bloom
+from .cache import barcode_cache
+from .gtin import normalize_gtin, product_key
+from .models import Shop, Product, ShopProduct, CatalogChange
+from .search import index_product, unindex_product
+
+
+def invalidate_barcode_cache(keys, keyset=False):
+    """Invalidate now and again once the surrounding transaction commits,
+    so no worker can re-cache the old row in between"""
+    keys = list(keys)
+    barcode_cache.invalidate(keys, keyset)
+    transaction.on_commit(lambda: barcode_cache.invalidate(keys, keyset))
+
+
+def invalidate_memberships(shop_ids, product_ids):
+    """Invalidate the shop scoped barcode lookups of products leaving
+    shops. Lookups of products a shop does not carry are not cached, so
+    additions need none."""
+    keys = [
+        product_key(gtin, barcode)
+        for gtin, barcode in Product.objects.filter(pk__in=product_ids)
+        .values_list('gtin', 'barcode')
+    ]
+    invalidate_barcode_cache(
+        f'{shop_id}/{key}' for shop_id in shop_ids for key in keys
+    )
+
+
+def bump_catalog_versions(shop_ids):
+    """Mark the offline catalog packs and the representations of shops as
+    out of date"""
+    Shop.objects.filter(pk__in=shop_ids).update(
+        catalog_version=F('catalog_version') + 1,
+        updated_at=timezone.now()
+    )
+
+
+def record_membership_changes(shop_ids, product_ids, deleted):
+    CatalogChange.objects.bulk_create(
+        CatalogChange(shop_id=shop_id, product_id=product_id,
+                      deleted=deleted)
+        for shop_id in shop_ids for product_id in product_ids
+    )
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    """Product rows changed, including image uploads"""
+    barcode_changed = (
+        created or
+        instance.barcode != getattr(instance, '_loaded_barcode', None)
+    )
+    key = product_key(instance.gtin, instance.barcode)
+    if barcode_changed:
+        barcode_bloom.add(key)
+
+    keys = {key}
+    loaded = getattr(instance, '_loaded_barcode', None)
+    if loaded:
+        keys.add(normalize_gtin(loaded) or loaded)
+    invalidate_barcode_cache(keys, keyset=barcode_changed)
+    barcode_cache.mark_changed(keys, instance.updated_at.timestamp())
+    CatalogChange.objects.create(product_id=instance.pk)
+    index_product(instance)
+
+    if not created:
+        bump_catalog_versions(
+            ShopProduct.objects.filter(product=instance).values('shop_id')
+        )
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    keys = [product_key(instance.gtin, instance.barcode)]
+    invalidate_barcode_cache(keys)
+    barcode_cache.mark_changed(keys, timezone.now().timestamp())
+    CatalogChange.objects.create(product_id=instance.pk, deleted=True)
+    unindex_product(instance.pk)
+
+
+@receiver(m2m_changed, sender=Shop.products.through)
+def shop_products_changed(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    """Shop assortment changed through Shop.products or its reverse"""
+    if action == 'pre_clear':
+        if reverse:
+            shop_ids = list(ShopProduct.objects.filter(product=instance)
+                            .values_list('shop_id', flat=True))
+            invalidate_memberships(shop_ids, [instance.pk])
+            record_membership_changes(shop_ids, [instance.pk], True)
+            bump_catalog_versions(shop_ids)
+        else:
+            product_ids = list(ShopProduct.objects.filter(shop=instance)
+                               .values_list('product_id', flat=True))
+            invalidate_memberships([instance.pk], product_ids)
+            record_membership_changes([instance.pk], product_ids, True)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        deleted = action != 'post_add'
+        if not reverse:
+            if deleted:
+                invalidate_memberships([instance.pk], pk_set or ())
+            bump_catalog_versions([instance.pk])
+            record_membership_changes([instance.pk], pk_set or (), deleted)
+        elif pk_set:
+            if deleted:
+                invalidate_memberships(pk_set, [instance.pk])
+            bump_catalog_versions(pk_set)
+            record_membership_changes(pk_set, [instance.pk], deleted)
+
+
+@receiver(pre_delete, sender=Product)
+def product_deleting(sender, instance, **kwargs):
+    """The product is about to leave the shops carrying it, whose rows are
+    then deleted in one statement"""
+    shop_ids = list(ShopProduct.objects.filter(product=instance)
+                    .values_list('shop_id', flat=True))
+    if shop_ids:
+        bump_catalog_versions(shop_ids)
+        record_membership_changes(shop_ids, [instance.pk], True)
+
+
+@receiver(pre_delete, sender=Shop)
+def shop_deleting(sender, instance, **kwargs):
+    """Record the removal of every product of the shop at once"""
+    product_ids = list(ShopProduct.objects.filter(shop=instance)
+                       .values_list('product_id', flat=True))
+    invalidate_memberships([instance.pk], product_ids)
+    record_membership_changes([instance.pk], product_ids, True)
@@ -0,0 +1,96 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, When
+
+from .models import LOW_STOCK_THRESHOLD, ShopProduct
+
+
+class OutOfStock(Exception):
+    """Raised when a shop has less stock than requested"""
+
+    def __init__(self, product_ids=()):
+        super().__init__(f'Out of stock: {sorted(product_ids)}')
+        self.product_ids = product_ids
+
+
+class NotCarried(Exception):
+    """Raised when a shop does not carry products to restock"""
+
+    def __init__(self, product_ids=()):
+        super().__init__(f'Not carried: {sorted(product_ids)}')
+        self.product_ids = product_ids
+
+
+def change_by(quantities):
+    return Case(*(
+        When(product_id=pk, then=n) for pk, n in quantities.items()
+    ), output_field=IntegerField())
+
+
+def decrement_stock(shop_id, quantities):
+    """Take {product_id: quantity} out of a shop's stock in one UPDATE.
+
+    Every row is only decremented when it holds enough stock, checked in
+    the same statement, so concurrent checkouts need no SELECT FOR UPDATE
+    and only hold the row locks from the UPDATE to their commit. Raises
+    OutOfStock, with the stock unchanged, unless every product could be
+    decremented.
+    """
+    quantities = {pk: n for pk, n in quantities.items() if n}
+    if not quantities:
+        return
+
+    enough = Q()
+    for pk, n in quantities.items():
+        enough |= Q(product_id=pk, quantity__gte=n)
+    try:
+        with transaction.atomic():
+            updated = ShopProduct.objects.filter(shop_id=shop_id)\
+                .filter(enough)\
+                .update(quantity=F('quantity') - change_by(quantities))
+            if updated != len(quantities):
+                raise OutOfStock()
+    except OutOfStock:
+        raise OutOfStock(set(quantities) - set(
+            ShopProduct.objects.filter(shop_id=shop_id).filter(enough)
+            .values_list('product_id', flat=True)
+        ))
+
+
+def restock(shop_id, quantities):
+    """Add {product_id: quantity} to a shop's stock in one UPDATE.
+
+    Raises NotCarried, with the stock unchanged, unless the shop carries
+    every product.
+    """
+    quantities = {pk: n for pk, n in quantities.items() if n}
+    if not quantities:
+        return
+
+    carried = ShopProduct.objects.filter(
+        shop_id=shop_id, product_id__in=quantities
+    )
+    try:
+        with transaction.atomic():
+            updated = carried.update(
+                quantity=F('quantity') + change_by(quantities)
+            )
+            if updated != len(quantities):
+                raise NotCarried()
+    except NotCarried:
+        raise NotCarried(set(quantities) - set(
+            carried.values_list('product_id', flat=True)
+        ))
+
+
+def stock_rows(**filters):
+    """Return the stock rows matching filters joined with their products"""
+    return ShopProduct.objects.filter(**filters).select_related('product')\
+        .defer('product__search_vector')
+
+
+def low_stock(shop_id, threshold=LOW_STOCK_THRESHOLD):
+    """Return the shop's products with at most threshold in stock, on the
+    partial low stock index"""
+    threshold = min(threshold, LOW_STOCK_THRESHOLD)
+    return stock_rows(shop_id=shop_id, quantity__lte=threshold)\
+        .order_by('quantity', 'product_id')
@@ -0,0 +1,91 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+
+from shop import assortment
+from shop.models import Shop, Product, ShopProduct, Address, CatalogChange
+
+
+class AssortmentTests(TestCase):
+    """Test bulk changes of the products a shop carries"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='test123'
+        )
+        self.shop = Shop.objects.create(
+            user=self.user,
+            name='ABC Corner',
+            address=Address.objects.create(
+                user=self.user, country='Romania', postcode=574479,
+                region='Timis', city='Timisoara', street='Gheorghe Lazar',
+                number='24 A'
+            )
+        )
+        self.products = [
+            Product.objects.create(
+                user=self.user, name=f'Product {i}', description='',
+                quantity=1, price=1, barcode=f'ABC{i}'
+            )
+            for i in range(3)
+        ]
+        self.shop.products.add(*self.products)
+        CatalogChange.objects.all().delete()
+
+    def test_remove_products_one_delete(self):
+        """Test removing products is one DELETE recording each removal
+        once"""
+        ids = [product.id for product in self.products[:2]]
+
+        with CaptureQueriesContext(connection) as queries:
+            removed = assortment.remove_products(self.shop, ids + [0])
+
+        self.assertEqual(removed, set(ids))
+        self.assertEqual(len([
+            query for query in queries
+            if query['sql'].startswith('DELETE')
+        ]), 1)
+        self.assertEqual(
+            list(self.shop.products.all()), [self.products[2]]
+        )
+        self.assertEqual(sorted(
+            CatalogChange.objects.filter(deleted=True)
+            .values_list('product_id', flat=True)
+        ), ids)
+
+    def test_delete_shop_constant_queries(self):
+        """Test deleting a shop deletes its rows in one statement and
+        records every removal"""
+        other = Shop.objects.create(
+            user=self.user, name='Other', address=self.shop.address
+        )
+        other.products.add(self.products[0])
+        shop_id = self.shop.id
+
+        counts = []
+        for shop in (other, self.shop):
+            with CaptureQueriesContext(connection) as queries:
+                shop.delete()
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse(ShopProduct.objects.exists())
+        self.assertEqual(sorted(
+            CatalogChange.objects.filter(shop_id=shop_id, deleted=True)
+            .values_list('product_id', flat=True)
+        ), [product.id for product in self.products])
+
+    def test_delete_product_records_memberships(self):
+        """Test deleting a product records its removal from shops"""
+        self.shop.refresh_from_db()
+        version = self.shop.catalog_version
+        product_id = self.products[0].id
+        self.products[0].delete()
+
+        self.shop.refresh_from_db()
+        self.assertEqual(self.shop.catalog_version, version + 1)
+        self.assertTrue(CatalogChange.objects.filter(
+            shop_id=self.shop.id, product_id=product_id, deleted=True
+        ).exists())
@@ -0,0 +1,145 @@
+import datetime
+from unittest.mock import patch
+
+from django.urls import reverse
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop.bloom import BloomFilter, barcode_bloom
+from shop.cache import barcode_cache
+from shop.models import Product
+
+
+def shop_product_barcode_url(barcode):
+    return reverse('shop:product-barcode', args=[barcode])
+
+
+def sample_product(user, barcode='1239832798432'):
+    return Product(
+        user=user,
+        name='Product name',
+        description='Product description',
+        quantity=5,
+        price=10,
+        barcode=barcode,
+    )
+
+
+class BloomFilterTests(TestCase):
+
+    def test_no_false_negatives(self):
+        """Test every added value is reported as present"""
+        bloom = BloomFilter(1000, 0.01)
+        values = [str(i) for i in range(1000)]
+        for value in values:
+            bloom.add(value)
+
+        self.assertTrue(all(value in bloom for value in values))
+        self.assertEqual(bloom.stats()['items'], 1000)
+
+    def test_false_positive_rate(self):
+        """Test the false positive rate stays near the configured one"""
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(str(i))
+
+        false_positives = sum(
+            str(i) in bloom for i in range(1000, 11000)
+        )
+        self.assertLess(false_positives, 300)
+
+
+class BarcodeBloomTests(TestCase):
+
+    def setUp(self):
+        single_process = patch.object(barcode_cache, 'single_process', True)
+        single_process.start()
+        self.addCleanup(single_process.stop)
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_unknown_barcode_skips_database(self):
+        """Test definitely unknown barcodes 404 without a query"""
+        barcode_bloom.rebuild()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(shop_product_barcode_url('ABC-404'))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_catches_up_with_other_workers(self):
+        """Test barcodes added without this worker's signals are found"""
+        barcode_bloom.rebuild()
+        Product.objects.bulk_create([sample_product(self.user, 'ABC-200')])
+        barcode_cache.invalidate([], keyset=True)
+
+        res = self.client.get(shop_product_barcode_url('ABC-200'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_catch_up_scans_since_last_catch_up(self):
+        """Test catching up only rescans products updated since the last
+        catch up and does not count barcodes twice"""
+        barcode_bloom.rebuild()
+        Product.objects.bulk_create([sample_product(self.user, 'ABC-210')])
+        barcode_cache.invalidate([], keyset=True)
+        self.assertTrue(barcode_bloom.might_contain('ABC-210'))
+        Product.objects.filter(barcode='ABC-210').update(
+            updated_at=timezone.now() - datetime.timedelta(minutes=1)
+        )
+        items = barcode_bloom.filter.count
+
+        Product.objects.bulk_create([sample_product(self.user, 'ABC-211')])
+        barcode_cache.invalidate([], keyset=True)
+        with patch.object(barcode_bloom.filter, 'add',
+                          wraps=barcode_bloom.filter.add) as add:
+            self.assertTrue(barcode_bloom.might_contain('ABC-211'))
+
+        add.assert_called_once_with('ABC-211')
+        self.assertEqual(barcode_bloom.filter.count, items + 1)
+
+        Product.objects.get(barcode='ABC-211').save()
+        self.assertEqual(barcode_bloom.filter.count, items + 1)
+
+    def test_saved_barcode_added(self):
+        """Test barcodes saved by this worker are added to the filter"""
+        barcode_bloom.rebuild()
+        sample_product(self.user, 'ABC-201').save()
+
+        self.assertTrue(barcode_bloom.might_contain('ABC-201'))
+
+    def test_stale_filter_rebuilt_in_background(self):
+        """Test an expired filter keeps answering while it is rebuilt off
+        the request"""
+        barcode_bloom.rebuild()
+        old = barcode_bloom.filter
+        Product.objects.bulk_create([sample_product(self.user, 'ABC-202')])
+
+        with patch.object(barcode_bloom, 'rebuild_interval', 0), \
+                patch('shop.bloom.Thread') as thread:
+            self.assertFalse(barcode_bloom.might_contain('ABC-202'))
+            barcode_bloom.might_contain('ABC-202')
+
+        thread.assert_called_once()
+        self.assertIs(barcode_bloom.filter, old)
+
+        thread.call_args[1]['target']()
+        self.assertFalse(barcode_bloom.rebuilding)
+        self.assertTrue(barcode_bloom.might_contain('ABC-202'))
+
+    def test_disabled_on_local_backend(self):
+        """Test the filter is off when other workers' barcodes cannot be
+        seen through the cache"""
+        barcode_bloom.rebuild()
+
+        with patch.object(barcode_cache, 'single_process', False):
+            self.assertTrue(barcode_bloom.might_contain('ABC-404'))
+            self.assertFalse(barcode_bloom.stats()['enabled'])
@@ -0,0 +1,135 @@
+import gzip
+import os
+import sqlite3
+import tempfile
+
+from django.urls import reverse
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop.catalog import build_catalog_pack
+from shop.models import Shop, Product, Address
+
+
+def catalog_url(shop_id):
+    return reverse('shop:shop-catalog', args=[shop_id])
+
+
+class CatalogPackTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings = override_settings(CATALOG_PACK_ROOT=self.tmp.name)
+        self.settings.enable()
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        address = Address.objects.create(
+            user=self.user,
+            country="Romania",
+            postcode=574479,
+            region="Timis",
+            city="Timisoara",
+            street="Gheorghe Lazar",
+            number="24 A"
+        )
+        self.shop = Shop.objects.create(
+            user=self.user, name='ABC Corner', address=address
+        )
+        self.product = Product.objects.create(
+            user=self.user,
+            name='Product name',
+            description='Product description',
+            quantity=5,
+            price=10,
+            barcode='036000291452',
+        )
+        self.shop.products.add(self.product)
+
+    def tearDown(self):
+        self.settings.disable()
+        self.tmp.cleanup()
+
+    def download(self, **headers):
+        res = self.client.get(catalog_url(self.shop.id), **headers)
+        if res.status_code == status.HTTP_304_NOT_MODIFIED:
+            return res, b''
+        return res, b''.join(res.streaming_content)
+
+    def test_download_catalog_pack(self):
+        """Test the pack is a gzipped SQLite file of the shop products"""
+        res, content = self.download()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        path = f'{self.tmp.name}/pack.sqlite'
+        with open(path, 'wb') as f:
+            f.write(gzip.decompress(content))
+        db = sqlite3.connect(path)
+        rows = db.execute('SELECT barcode, gtin, id FROM products').fetchall()
+        db.close()
+        self.assertEqual(
+            rows, [('036000291452', '00036000291452', self.product.id)]
+        )
+
+    def test_catalog_pack_not_modified(self):
+        """Test an unchanged catalog is not downloaded again"""
+        res, _ = self.download()
+        etag = res['ETag']
+
+        res, _ = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.product.price = 11
+        self.product.save()
+        res, _ = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_catalog_pack_version_follows_assortment(self):
+        """Test assortment changes produce a new catalog version"""
+        etag = self.download()[0]['ETag']
+        self.shop.products.remove(self.product)
+
+        self.assertNotEqual(self.download()[0]['ETag'], etag)
+
+    def test_catalog_pack_range(self):
+        """Test partial downloads can be resumed"""
+        _, content = self.download()
+
+        res, part = self.download(HTTP_RANGE='bytes=10-')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(part, content[10:])
+        self.assertEqual(
+            res['Content-Range'], f'bytes 10-{len(content) - 1}/{len(content)}'
+        )
+
+    def test_catalog_pack_builds_identical(self):
+        """Test rebuilding a version gives the same bytes"""
+        _, content = self.download()
+        self.shop.refresh_from_db()
+        os.remove(build_catalog_pack(self.shop))
+
+        _, rebuilt = self.download()
+
+        self.assertEqual(rebuilt, content)
+
+    def test_catalog_pack_keeps_previous_version(self):
+        """Test a new version keeps the previous pack and drops older ones
+        """
+        paths = []
+        for price in (11, 12, 13):
+            self.shop.refresh_from_db()
+            paths.append(build_catalog_pack(self.shop))
+            self.product.price = price
+            self.product.save()
+
+        self.assertEqual(
+            [os.path.exists(path) for path in paths], [False, True, True]
+        )
@@ -0,0 +1,117 @@
+from django.urls import reverse
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop.changes import parse_cursor
+from shop.models import Shop, Product, Address, CatalogChange
+
+
+CHANGES_URL = reverse('shop:product-changes')
+
+
+def sample_product(user, barcode='1239832798432'):
+    return Product.objects.create(
+        user=user,
+        name='Product name',
+        description='Product description',
+        quantity=5,
+        price=10,
+        barcode=barcode,
+    )
+
+
+class ChangeFeedTests(TestCase):
+    """Test the product change feed"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_changes_since_cursor(self):
+        """Test only changes after the cursor are returned"""
+        product1 = sample_product(self.user, '1')
+        cursor = self.client.get(CHANGES_URL).data['cursor']
+        product2 = sample_product(self.user, '2')
+        deleted_id = product1.id
+        product1.delete()
+
+        res = self.client.get(CHANGES_URL, {'since': cursor})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [product['id'] for product in res.data['upserts']], [product2.id]
+        )
+        self.assertEqual(res.data['tombstones'], [deleted_id])
+        self.assertGreater(parse_cursor(res.data['cursor']),
+                           parse_cursor(cursor))
+
+        res = self.client.get(CHANGES_URL, {'since': res.data['cursor']})
+        self.assertEqual(res.data['upserts'], [])
+
+    def test_changes_paginated(self):
+        """Test the feed is served in pages"""
+        for i in range(3):
+            sample_product(self.user, str(i))
+
+        res = self.client.get(CHANGES_URL, {'limit': 2})
+        self.assertTrue(res.data['has_more'])
+        self.assertEqual(len(res.data['upserts']), 2)
+
+        res = self.client.get(
+            CHANGES_URL, {'since': res.data['cursor'], 'limit': 2}
+        )
+        self.assertFalse(res.data['has_more'])
+        self.assertEqual(len(res.data['upserts']), 1)
+
+    def test_membership_changes(self):
+        """Test shop membership changes are part of the feed"""
+        product = sample_product(self.user)
+        shop = Shop.objects.create(
+            user=self.user,
+            name='ABC Corner',
+            address=Address.objects.create(
+                user=self.user,
+                country="Romania",
+                postcode=574479,
+                region="Timis",
+                city="Timisoara",
+                street="Gheorghe Lazar",
+                number="24 A"
+            )
+        )
+        cursor = self.client.get(CHANGES_URL).data['cursor']
+        shop.products.add(product)
+        shop.products.clear()
+
+        res = self.client.get(CHANGES_URL, {'since': cursor})
+
+        self.assertEqual(res.data['memberships'], [
+            {'shop': shop.id, 'product': product.id, 'deleted': True}
+        ])
+
+    def test_changes_plain_id_cursor(self):
+        """Test cursors of plain ids, handed out before cursors carried
+        the transaction id, are still followed"""
+        sample_product(self.user, '1')
+        since = CatalogChange.objects.get().id
+        product = sample_product(self.user, '2')
+
+        res = self.client.get(CHANGES_URL, {'since': since})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in res.data['upserts']], [product.id]
+        )
+
+    def test_changes_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        res = self.client.get(CHANGES_URL, {'since': 'abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,120 @@
+import json
+import tempfile
+from io import BytesIO, StringIO
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from shop.models import Product
+
+
+class CommandTests(TestCase):
+
+    def test_benchmark_product_list(self):
+        """Test the benchmark reports every renderer and rolls back"""
+        out = StringIO()
+
+        call_command('benchmark_product_list', products=20, iterations=1,
+                     stdout=out)
+
+        self.assertIn('JSONRenderer', out.getvalue())
+        self.assertIn('ORJSONRenderer', out.getvalue())
+        self.assertIn('gzip', out.getvalue())
+        self.assertFalse(Product.objects.exists())
+
+    @override_settings(PRODUCT_IMAGE_VARIANTS={
+        'SIZES': (4,), 'FORMATS': ('webp',),
+    })
+    def test_build_image_variants(self):
+        """Test backfilling image variants of existing products"""
+        product = Product.objects.create(
+            user=get_user_model().objects.create_user('test@test.com'),
+            name='Product name',
+            description='Product description',
+            quantity=5,
+            price=10,
+            barcode='54352345234',
+        )
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, format='PNG')
+        product.image.save('product.png', ContentFile(buffer.getvalue()))
+
+        call_command('build_image_variants', workers=1, stdout=StringIO())
+
+        product.refresh_from_db()
+        variants = json.loads(product.image_variants)
+        self.assertTrue(default_storage.exists(variants['webp']['4']))
+        default_storage.delete(variants['webp']['4'])
+        product.image.delete()
+
+    def test_collect_product_images(self):
+        """Test unreferenced product images are deleted, shared ones kept"""
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            self.collect_product_images()
+
+    def collect_product_images(self):
+        user = get_user_model().objects.create_user('test@test.com')
+        content = SimpleUploadedFile('product.png', b'image')
+        products = [
+            Product.objects.create(
+                user=user,
+                name=f'Product name {i}',
+                description='Product description',
+                quantity=5,
+                price=10,
+                barcode=f'5435234523{i}',
+                image=content,
+            )
+            for i in range(2)
+        ]
+        self.assertEqual(products[0].image.name, products[1].image.name)
+        orphan = default_storage.save('uploads/product/orphan.png',
+                                      ContentFile(b'orphan'))
+
+        products[0].delete()
+        call_command('collect_product_images', grace=0, stdout=StringIO())
+
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(products[1].image.name))
+
+    def test_shard_product_images(self):
+        """Test moving flat product images to the sharded layout"""
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            self.shard_product_images()
+
+    def shard_product_images(self):
+        name = default_storage.save(
+            'uploads/product/1b4e28ba-2fa1-11d2-883f-0016d3cca427.jpg',
+            ContentFile(b'image')
+        )
+        product = Product.objects.create(
+            user=get_user_model().objects.create_user('test@test.com'),
+            name='Product name',
+            description='Product description',
+            quantity=5,
+            price=10,
+            barcode='54352345234',
+        )
+        Product.objects.filter(pk=product.pk).update(image=name)
+
+        call_command('shard_product_images', stdout=StringIO())
+        out = StringIO()
+        call_command('shard_product_images', stdout=out)
+
+        product.refresh_from_db()
+        self.assertEqual(
+            product.image.name,
+            'uploads/product/1b/4e/1b4e28ba-2fa1-11d2-883f-0016d3cca427.jpg'
+        )
+        with product.image.open('rb') as f:
+            self.assertEqual(f.read(), b'image')
+        self.assertTrue(default_storage.exists(name))
+        self.assertIn('Moved the images of 0 products', out.getvalue())
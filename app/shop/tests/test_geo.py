@@ -0,0 +1,51 @@
+from django.test import SimpleTestCase
+
+from shop.geo import bounding_box, covering_cells, encode_geohash, \
+    haversine, prefix_range
+
+
+class GeoTests(SimpleTestCase):
+    """Test the geohash helpers"""
+
+    def test_encode_geohash(self):
+        """Test encoding points as geohashes"""
+        self.assertEqual(encode_geohash(57.64911, 10.40744, 11),
+                         'u4pruydqqvj')
+        self.assertEqual(encode_geohash(45.7489, 21.2087, 5), 'u2ph6')
+
+    def test_haversine(self):
+        """Test the great circle distance between Timisoara and Arad"""
+        distance = haversine(45.7489, 21.2087, 46.1866, 21.3123)
+
+        self.assertAlmostEqual(distance, 49.4, delta=0.5)
+
+    def test_prefix_range(self):
+        """Test the geohash ranges of prefixes"""
+        self.assertEqual(prefix_range('u2r'), ('u2r', 'u2s'))
+        self.assertEqual(prefix_range('u9'), ('u9', 'ub'))
+        self.assertEqual(prefix_range('uz'), ('uz', 'v'))
+        self.assertEqual(prefix_range('zz'), ('zz', None))
+
+    def test_bounding_box_antimeridian(self):
+        """Test boxes across the antimeridian are split in two"""
+        min_lat, max_lat, lon_ranges = bounding_box(0, 179.99, 10)
+
+        self.assertLess(min_lat, 0)
+        self.assertGreater(max_lat, 0)
+        self.assertEqual(len(lon_ranges), 2)
+        self.assertEqual(lon_ranges[0][1], 180.0)
+        self.assertEqual(lon_ranges[1][0], -180.0)
+
+    def test_covering_cells(self):
+        """Test the covering cells contain every point of the box"""
+        box = bounding_box(45.7489, 21.2087, 5)
+        cells = covering_cells(*box)
+
+        self.assertLessEqual(len(cells), 16)
+        min_lat, max_lat, [(min_lon, max_lon)] = box
+        for lat in (min_lat, max_lat):
+            for lon in (min_lon, max_lon):
+                self.assertTrue(any(
+                    encode_geohash(lat, lon).startswith(cell)
+                    for cell in cells
+                ))
@@ -0,0 +1,33 @@
+from django.test import TestCase
+
+from shop.gtin import normalize_gtin, canonical_barcode, barcode_filter
+
+
+class GtinTests(TestCase):
+
+    def test_normalize_gtin_representations(self):
+        """Test UPC-A, EAN-13 and GTIN-14 of one item share a GTIN-14"""
+        self.assertEqual(normalize_gtin('036000291452'), '00036000291452')
+        self.assertEqual(normalize_gtin('0036000291452'), '00036000291452')
+        self.assertEqual(normalize_gtin('00036000291452'), '00036000291452')
+        self.assertEqual(normalize_gtin('96385074'), '00000096385074')
+
+    def test_normalize_gtin_invalid(self):
+        """Test codes that are not GTINs are not normalized"""
+        self.assertIsNone(normalize_gtin('036000291453'))
+        self.assertIsNone(normalize_gtin('54352345234'))
+        self.assertIsNone(normalize_gtin('ABC-123'))
+
+    def test_barcode_filter(self):
+        """Test lookups use the GTIN column for GTINs only"""
+        self.assertEqual(
+            barcode_filter('4006381333931'), {'gtin': '04006381333931'}
+        )
+        self.assertEqual(barcode_filter('ABC-123'), {'barcode': 'ABC-123'})
+
+    def test_canonical_barcode_malformed(self):
+        """Test malformed barcodes are rejected"""
+        with self.assertRaises(ValueError):
+            canonical_barcode('abc def')
+        with self.assertRaises(ValueError):
+            canonical_barcode('')
@@ -0,0 +1,136 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from shop.bloom import barcode_bloom
+from shop.cache import barcode_cache
+from shop.index import BarcodeIndex, barcode_index, write_index
+from shop.models import Product
+
+
+def shop_product_barcode_url(barcode):
+    return reverse('shop:product-barcode', args=[barcode])
+
+
+class BarcodeIndexTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'barcode.idx')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_and_lookup(self):
+        """Test indexed barcodes are found by binary search"""
+        rows = [
+            (f'{i:05}', i, f'Product {i}', 1.5, i, True, f'{i:05}', i / 2)
+            for i in range(100)
+        ]
+        write_index(self.path, 7, reversed(rows))
+        index = BarcodeIndex(self.path)
+
+        updated_at, record = index.lookup('00042')
+        self.assertEqual(updated_at, 21)
+        self.assertEqual(record['id'], 42)
+        self.assertEqual(record['name'], 'Product 42')
+        self.assertIsNone(index.lookup('00100'))
+
+
+class BarcodeIndexApiTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='test123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(
+            user=self.user,
+            name='Product name',
+            description='Product description',
+            quantity=5,
+            price=10,
+            barcode='036000291452',
+        )
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, 'barcode.idx')
+        with open(os.devnull, 'w') as devnull:
+            call_command('build_barcode_index', path=path, stdout=devnull)
+        self.patches = [
+            patch.object(barcode_index, 'path', path),
+            patch.object(barcode_index, 'check_interval', 0),
+            patch.object(barcode_cache, 'single_process', True),
+        ]
+        for p in self.patches:
+            p.start()
+        barcode_bloom.rebuild()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.tmp.cleanup()
+
+    def test_lookup_served_from_index(self):
+        """Test scans asking for indexed fields skip the database"""
+        url = shop_product_barcode_url('0036000291452')
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url, {'fields': 'id,price'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'id': self.product.id, 'price': 10})
+
+    def test_changed_product_falls_back_to_database(self):
+        """Test products changed since the build are read from the db"""
+        self.product.price = 12
+        self.product.save()
+
+        res = self.client.get(
+            shop_product_barcode_url(self.product.barcode),
+            {'fields': 'id,price'}
+        )
+
+        self.assertEqual(res.data, {'id': self.product.id, 'price': 12})
+
+    def test_unrelated_change_keeps_index(self):
+        """Test other products changing does not stop the index serving a
+        product"""
+        Product.objects.create(
+            user=self.user,
+            name='Other',
+            description='Product description',
+            quantity=5,
+            price=10,
+            barcode='ABC-1',
+        )
+        url = shop_product_barcode_url('0036000291452')
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url, {'fields': 'id,price'})
+
+        self.assertEqual(res.data, {'id': self.product.id, 'price': 10})
+
+    def test_legacy_duplicate_indexed(self):
+        """Test legacy duplicates of a GTIN no product holds are indexed
+        under the GTIN"""
+        Product.objects.filter(pk=self.product.pk).update(gtin=None)
+        with open(os.devnull, 'w') as devnull:
+            call_command('build_barcode_index', path=barcode_index.path,
+                         stdout=devnull)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(
+                shop_product_barcode_url('0036000291452'), {'fields': 'id'}
+            )
+
+        self.assertEqual(res.data, {'id': self.product.id})
@@ -1,7 +1,9 @@
+import hashlib
 from unittest.mock import patch
 
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
 
 from shop.models import Shop, Product, product_image_file_path, Address
 
@@ -53,6 +55,41 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(product), product.name)
 
+    def test_product_gtin_normalized(self):
+        """Test the canonical GTIN-14 is stored on save"""
+        product = Product.objects.create(
+            user=sample_user(),
+            name='Product name',
+            description='Product description',
+            quantity=5,
+            price=10,
+            barcode='036000291452',
+        )
+
+        self.assertEqual(product.gtin, '00036000291452')
+
+    def test_product_search_vector_deferred(self):
+        """Test products are loaded without their search vector"""
+        product = Product.objects.create(
+            user=sample_user(),
+            name='Product name',
+            description='Product description',
+            quantity=5,
+            price=10,
+            barcode='036000291452',
+        )
+
+        loaded = Product.objects.get(pk=product.pk)
+        self.assertIn('search_vector', loaded.get_deferred_fields())
+        self.assertNotIn(
+            'search_vector', str(Product._base_manager.all().query)
+        )
+
+        loaded.price = 12
+        loaded.save()
+        loaded.refresh_from_db(fields=['price'])
+        self.assertEqual(loaded.price, 12)
+
     @patch('uuid.uuid4')
     def test_product_file_name_uuid(self, mock_uuid):
         """Test that image is saved in the correct location"""
@@ -60,9 +97,21 @@ class ModelTests(TestCase):
         mock_uuid.return_value = uuid
         file_path = product_image_file_path(None, 'myimage.jpg')
 
-        exp_path = f'uploads/product/{uuid}.jpg'
+        exp_path = f'uploads/product/te/st/{uuid}.jpg'
         self.assertEqual(file_path, exp_path)
 
+    def test_product_file_name_content_hash(self):
+        """Test uploaded images are named after their content"""
+        product = Product(image=SimpleUploadedFile('image.JPG', b'image'))
+
+        file_path = product_image_file_path(product, 'image.JPG')
+
+        digest = hashlib.sha256(b'image').hexdigest()
+        self.assertEqual(
+            file_path, f'uploads/product/{digest[:2]}/{digest[2:4]}/'
+                       f'{digest}.jpg'
+        )
+
     def test_create_address(self):
         """Test the address string representation"""
         address = Address.objects.create(
@@ -1,20 +1,31 @@
+import json
 import tempfile
 import os
+from io import BytesIO
+from unittest import skipUnless
+from unittest.mock import patch
 
 from PIL import Image
 
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from shop.models import Product
+from core.renderers import msgpack
+from shop.bloom import barcode_bloom
+from shop.cache import barcode_cache
+from shop.images import render_variants
+from shop.models import Shop, Product, Address
 from shop.serializers import ProductSerializer
 
 
 PRODUCT_URL = reverse('shop:product-list')
+BARCODES_URL = reverse('shop:product-barcodes')
 
 
 def detail_url(product_id):
@@ -26,6 +37,14 @@ def shop_product_barcode_url(barcode):
     return reverse('shop:product-barcode', args=[barcode])
 
 
+def barcode_prefix_url(prefix):
+    return reverse('shop:product-barcode-prefix', args=[prefix])
+
+
+def barcode_stats_url():
+    return reverse('shop:product-barcode-stats')
+
+
 def image_upload_url(product_id):
     """Return url for product image upload"""
     return reverse('shop:product-upload-image', args=[product_id])
@@ -114,6 +133,417 @@ class ProductTests(TestCase):
 
         self.assertEqual(res.data, serializer.data)
 
+    def test_product_detail_not_modified(self):
+        """Test unchanged products are answered with 304"""
+        product = Product.objects.create(
+            user=self.user,
+            name='Product name 1',
+            description='Product description 1',
+            quantity=5,
+            price=10,
+            barcode='1239832798432',
+        )
+        res = self.client.get(detail_url(product.id))
+        etag = res['ETag']
+
+        res = self.client.get(detail_url(product.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        product.price = 11
+        product.save()
+        res = self.client.get(detail_url(product.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_product_list_not_modified(self):
+        """Test an unchanged product list is answered with 304"""
+        Product.objects.create(
+            user=self.user,
+            name='Product name 1',
+            description='Product description 1',
+            quantity=5,
+            price=10,
+            barcode='1239832798432',
+        )
+        res = self.client.get(PRODUCT_URL)
+        self.assertNotIn('Last-Modified', res)
+
+        with self.assertNumQueries(2):
+            res = self.client.get(PRODUCT_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_product_list_if_modified_since_ignored(self):
+        """Test lists do not answer 304 on If-Modified-Since alone, which
+        would miss rows deleted from the page"""
+        products = [
+            Product.objects.create(
+                user=self.user,
+                name=f'Product name {i}',
+                description='Product description',
+                quantity=5,
+                price=10,
+                barcode=f'35324523{i:02}',
+            )
+            for i in range(2)
+        ]
+        products[0].delete()
+
+        res = self.client.get(
+            PRODUCT_URL,
+            HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_product_list_cursor(self):
+        """Test walking the product list with cursor pagination"""
+        for i in range(25):
+            Product.objects.create(
+                user=self.user,
+                name=f'Product name {i}',
+                description='Product description',
+                quantity=5,
+                price=10,
+                barcode=f'35324523{i:02}',
+            )
+
+        ids = []
+        url = f'{PRODUCT_URL}?cursor='
+        while url:
+            with self.assertNumQueries(1):
+                res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', res.data)
+            ids += [product['id'] for product in res.data['results']]
+            url = res.data['next']
+
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_search_products(self):
+        """Test searching products ranks name matches first"""
+        in_name = Product.objects.create(
+            user=self.user,
+            name='Organic milk',
+            description='Fresh',
+            quantity=5,
+            price=10,
+            barcode='3532452342',
+        )
+        in_description = Product.objects.create(
+            user=self.user,
+            name='Cheese',
+            description='Made from organic milk',
+            quantity=5,
+            price=10,
+            barcode='1239832798432',
+        )
+        Product.objects.create(
+            user=self.user,
+            name='Bread',
+            description='Whole grain',
+            quantity=5,
+            price=10,
+            barcode='5901234123457',
+        )
+
+        res = self.client.get(PRODUCT_URL, {'q': 'organ mil'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [product['id'] for product in res.data['results']],
+            [in_name.id, in_description.id]
+        )
+
+    def test_search_products_cursor_newest_first(self):
+        """Test cursor pages of search results are newest first, not
+        ranked"""
+        in_name = Product.objects.create(
+            user=self.user,
+            name='Organic milk',
+            description='Fresh',
+            quantity=5,
+            price=10,
+            barcode='3532452342',
+        )
+        in_description = Product.objects.create(
+            user=self.user,
+            name='Cheese',
+            description='Made from organic milk',
+            quantity=5,
+            price=10,
+            barcode='1239832798432',
+        )
+
+        res = self.client.get(PRODUCT_URL, {'q': 'organ mil', 'cursor': ''})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [product['id'] for product in res.data['results']],
+            [in_description.id, in_name.id]
+        )
+
+    def test_search_products_updated(self):
+        """Test search follows renamed and deleted products"""
+        product = Product.objects.create(
+            user=self.user,
+            name='Organic milk',
+            description='Fresh',
+            quantity=5,
+            price=10,
+            barcode='3532452342',
+        )
+        product.name = 'Soy drink'
+        product.save()
+
+        res = self.client.get(PRODUCT_URL, {'q': 'milk'})
+        self.assertEqual(res.data['results'], [])
+        res = self.client.get(PRODUCT_URL, {'q': 'soy'})
+        self.assertEqual(len(res.data['results']), 1)
+
+        product.delete()
+        res = self.client.get(PRODUCT_URL, {'q': 'soy'})
+        self.assertEqual(res.data['results'], [])
+
+    def test_barcode_prefix(self):
+        """Test products are matched by the start of their barcode"""
+        for barcode in ('5901234123457', '5901234000001', '4006381333931'):
+            Product.objects.create(
+                user=self.user,
+                name='Product name',
+                description='Product description',
+                quantity=5,
+                price=10,
+                barcode=barcode,
+            )
+
+        res = self.client.get(barcode_prefix_url('590123'), {'limit': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([product['barcode'] for product in res.data],
+                         ['5901234000001'])
+
+    def test_barcode_prefix_too_short(self):
+        """Test short prefixes are refused"""
+        res = self.client.get(barcode_prefix_url('59'))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_products(self):
+        """Test filtering the product list in one query per page"""
+        low_stock = Product.objects.create(
+            user=self.user,
+            name='Product name 1',
+            description='Product description 1',
+            quantity=2,
+            price=10,
+            barcode='3532452342',
+        )
+        Product.objects.create(
+            user=self.user,
+            name='Product name 2',
+            description='Product description 2',
+            quantity=2,
+            price=10,
+            barcode='1239832798432',
+            is_active=False,
+        )
+        in_stock = Product.objects.create(
+            user=self.user,
+            name='Product name 3',
+            description='Product description 3',
+            quantity=100,
+            price=10,
+            barcode='5901234123457',
+        )
+        shop = Shop.objects.create(
+            user=self.user,
+            name='ABC Corner',
+            address=Address.objects.create(
+                user=self.user,
+                country="Romania",
+                postcode=574479,
+                region="Timis",
+                city="Timisoara",
+                street="Str. Mihai Eminescu",
+                number=2,
+            )
+        )
+        shop.products.add(low_stock, in_stock)
+        params = {'cursor': '', 'is_active': 'true', 'quantity_max': 5,
+                  'price_min': 5, 'price_max': 20, 'shop': shop.id}
+
+        with self.assertNumQueries(1):
+            res = self.client.get(PRODUCT_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([product['id'] for product in res.data['results']],
+                         [low_stock.id])
+
+    def test_filter_products_invalid(self):
+        """Test invalid filters are refused"""
+        res = self.client.get(PRODUCT_URL, {'price_min': 'cheap'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_product_list_fields(self):
+        """Test listing only the requested product fields"""
+        product = Product.objects.create(
+            user=self.user,
+            name='Product name 1',
+            description='Product description 1',
+            quantity=5,
+            price=10,
+            barcode='1239832798432',
+        )
+
+        with self.assertNumQueries(1):
+            res = self.client.get(PRODUCT_URL, {
+                'cursor': '', 'fields': 'id,name,price,barcode,updated_at'
+            })
+
+        expected = ProductSerializer(product).data
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [{
+            name: expected[name]
+            for name in ('id', 'name', 'price', 'barcode', 'updated_at')
+        }])
+
+    def test_search_products_cursor_fields(self):
+        """Test walking search results by cursor with sparse fields"""
+        for i in range(15):
+            Product.objects.create(
+                user=self.user,
+                name=f'Apple {i}',
+                description='Product description',
+                quantity=5,
+                price=10,
+                barcode=f'35324523{i:02}',
+            )
+
+        ids = []
+        url = f'{PRODUCT_URL}?q=apple&cursor=&fields=id,name'
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                set(res.data['results'][0]), {'id', 'name'}
+            )
+            ids += [product['id'] for product in res.data['results']]
+            url = res.data['next']
+
+        self.assertEqual(len(ids), 15)
+
+    def test_product_detail_omit(self):
+        """Test leaving out product fields"""
+        product = Product.objects.create(
+            user=self.user,
+            name='Product name 1',
+            description='Product description 1',
+            quantity=5,
+            price=10,
+            barcode='1239832798432',
+        )
+
+        res = self.client.get(detail_url(product.id),
+                              {'omit': 'description,image'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('description', res.data)
+        self.assertNotIn('image', res.data)
+        self.assertEqual(res.data['name'], product.name)
+
+    def test_product_list_unknown_fields(self):
+        """Test requesting unknown fields is refused"""
+        res = self.client.get(PRODUCT_URL, {'fields': 'id,user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_product_msgpack(self):
+        """Test creating and listing products with MessagePack"""
+        payload = {
+            'name': 'Product name 1',
+            'description': 'Product description 1',
+            'quantity': 5,
+            'price': 10.5,
+            'barcode': '1239832798432',
+        }
+        res = self.client.post(PRODUCT_URL, msgpack.packb(payload),
+                               content_type='application/msgpack')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.get(PRODUCT_URL,
+                              HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        product = msgpack.unpackb(res.content)['results'][0]
+        self.assertEqual(product['barcode'], payload['barcode'])
+        self.assertEqual(product['price'], payload['price'])
+
+    def test_product_list_invalid_cursor(self):
+        """Test an invalid cursor is answered with 404"""
+        res = self.client.get(PRODUCT_URL, {'cursor': 'invalid'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_update_product_stale_if_match(self):
+        """Test updates based on an outdated representation are refused"""
+        product = Product.objects.create(
+            user=self.user,
+            name='Product name 1',
+            description='Product description 1',
+            quantity=5,
+            price=10,
+            barcode='1239832798432',
+        )
+        etag = self.client.get(detail_url(product.id))['ETag']
+        product.price = 11
+        product.save()
+
+        res = self.client.patch(
+            detail_url(product.id), {'price': 12}, HTTP_IF_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        product.refresh_from_db()
+        self.assertEqual(product.price, 11)
+
+    def test_legacy_gtin_duplicate(self):
+        """Test legacy duplicates of a GTIN can be saved and are found by
+        their barcode once no product holds the GTIN"""
+        holder = Product.objects.create(
+            user=self.user, name='Holder', description='',
+            quantity=1, price=1, barcode='036000291452'
+        )
+        duplicate = Product.objects.create(
+            user=self.user, name='Duplicate', description='',
+            quantity=1, price=1, barcode='ABC'
+        )
+        # As left by migration 0012
+        Product.objects.filter(pk=duplicate.pk).update(
+            barcode='0036000291452', gtin=None
+        )
+
+        duplicate = Product.objects.get(pk=duplicate.pk)
+        duplicate.name = 'Renamed'
+        duplicate.save()
+        duplicate.refresh_from_db()
+        self.assertIsNone(duplicate.gtin)
+
+        res = self.client.get(shop_product_barcode_url('0036000291452'))
+        self.assertEqual(res.data['id'], holder.id)
+
+        holder.delete()
+        res = self.client.get(shop_product_barcode_url('0036000291452'))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['id'], duplicate.id)
+
+        res = self.client.post(BARCODES_URL, {
+            'barcodes': ['0036000291452']
+        }, format='json')
+        self.assertEqual(res.data['0036000291452']['id'], duplicate.id)
+
     def test_get_shop_product_by_barcode(self):
         """Test get a shop product by barcode"""
         product1 = Product.objects.create(
@@ -140,6 +570,209 @@ class ProductTests(TestCase):
         serializer = ProductSerializer(res.data)
         self.assertEqual(product1.name, serializer.data['name'])
 
+    def test_get_product_by_any_gtin_representation(self):
+        """Test UPC-A, EAN-13 and GTIN-14 scans resolve the same product"""
+        product = Product.objects.create(
+            user=self.user,
+            name='Product name 1',
+            description='Product description 1',
+            quantity=5,
+            price=10,
+            barcode='036000291452',
+        )
+
+        for code in ('036000291452', '0036000291452', '00036000291452'):
+            res = self.client.get(shop_product_barcode_url(code))
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.data['id'], product.id)
+
+    def test_get_product_by_malformed_barcode(self):
+        """Test malformed barcodes are rejected without a query"""
+        with self.assertNumQueries(0):
+            res = self.client.get(shop_product_barcode_url('abc def'))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_product_duplicate_gtin(self):
+        """Test another representation of a known GTIN is rejected"""
+        Product.objects.create(
+            user=self.user,
+            name='Product name 1',
+            description='Product description 1',
+            quantity=5,
+            price=10,
+            barcode='036000291452',
+        )
+        payload = {
+            'name': 'Product name 2',
+            'description': 'Product description 2',
+            'quantity': 5,
+            'price': 10,
+            'barcode': '0036000291452',
+        }
+        res = self.client.post(PRODUCT_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch.object(barcode_cache, 'single_process', True)
+    def test_barcode_lookup_served_from_cache(self):
+        """Test repeated barcode lookups do not hit the database"""
+        barcode_bloom.rebuild()
+        product = Product.objects.create(
+            user=self.user,
+            name='Product name 1',
+            description='Product description 1',
+            quantity=5,
+            price=10,
+            barcode='1239832798432',
+        )
+        self.client.get(shop_product_barcode_url(product.barcode))
+
+        with self.assertNumQueries(0):
+            res = self.client.get(shop_product_barcode_url(product.barcode))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['id'], product.id)
+
+    @patch.object(barcode_cache, 'single_process', True)
+    def test_barcode_cache_invalidated_per_barcode(self):
+        """Test saving a product keeps other barcodes cached"""
+        barcode_bloom.rebuild()
+        products = [
+            Product.objects.create(
+                user=self.user,
+                name=f'Product name {i}',
+                description='Product description',
+                quantity=5,
+                price=10,
+                barcode=f'ABC-30{i}',
+            )
+            for i in range(2)
+        ]
+        for product in products:
+            self.client.get(shop_product_barcode_url(product.barcode))
+
+        products[0].price = 12.5
+        products[0].save()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(shop_product_barcode_url('ABC-301'))
+        self.assertEqual(res.data['id'], products[1].id)
+        res = self.client.get(shop_product_barcode_url('ABC-300'))
+        self.assertEqual(res.data['price'], 12.5)
+
+    def test_barcode_cache_bypassed_on_local_backend(self):
+        """Test lookups skip a cache other workers cannot invalidate"""
+        product = Product.objects.create(
+            user=self.user,
+            name='Product name 1',
+            description='Product description 1',
+            quantity=5,
+            price=10,
+            barcode='1239832798432',
+        )
+        self.client.get(shop_product_barcode_url(product.barcode))
+        # As saved by another worker, whose invalidation never gets here
+        Product.objects.filter(pk=product.pk).update(price=12.5)
+
+        res = self.client.get(shop_product_barcode_url(product.barcode))
+
+        self.assertFalse(barcode_cache.enabled)
+        self.assertEqual(res.data['price'], 12.5)
+
+    def test_barcode_cache_invalidated_on_save(self):
+        """Test a product change is visible on the next barcode lookup"""
+        product = Product.objects.create(
+            user=self.user,
+            name='Product name 1',
+            description='Product description 1',
+            quantity=5,
+            price=10,
+            barcode='1239832798432',
+        )
+        self.client.get(shop_product_barcode_url(product.barcode))
+
+        product.price = 12.5
+        product.save()
+        res = self.client.get(shop_product_barcode_url(product.barcode))
+
+        self.assertEqual(res.data['price'], 12.5)
+
+    def test_barcode_cache_invalidated_on_delete(self):
+        """Test a deleted product is not served from the cache"""
+        product = Product.objects.create(
+            user=self.user,
+            name='Product name 1',
+            description='Product description 1',
+            quantity=5,
+            price=10,
+            barcode='1239832798432',
+        )
+        self.client.get(shop_product_barcode_url(product.barcode))
+
+        product.delete()
+        res = self.client.get(shop_product_barcode_url('1239832798432'))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_batch_barcode_lookup(self):
+        """Test resolving a list of barcodes in one query"""
+        product = Product.objects.create(
+            user=self.user,
+            name='Product name 1',
+            description='Product description 1',
+            quantity=5,
+            price=10,
+            barcode='1239832798432',
+        )
+        payload = {'barcodes': [product.barcode, '000000']}
+
+        with self.assertNumQueries(1):
+            res = self.client.post(BARCODES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[product.barcode]['id'], product.id)
+        self.assertEqual(res.data['000000'], {'detail': 'Not found.'})
+
+    @override_settings(BARCODE_BATCH_CHUNK_SIZE=2)
+    def test_batch_barcode_lookup_chunked(self):
+        """Test large barcode lists are resolved in chunks"""
+        for i in range(3):
+            Product.objects.create(
+                user=self.user,
+                name=f'Product name {i}',
+                description='Product description',
+                quantity=5,
+                price=10,
+                barcode=f'12398327984{i}',
+            )
+        payload = {'barcodes': [f'12398327984{i}' for i in range(3)]}
+
+        with self.assertNumQueries(2):
+            res = self.client.post(BARCODES_URL, payload, format='json')
+
+        self.assertEqual(len(res.data), 3)
+        self.assertNotIn('detail', res.data['123983279842'])
+
+    def test_batch_barcode_lookup_invalid(self):
+        """Test an empty barcode list is rejected"""
+        res = self.client.post(BARCODES_URL, {'barcodes': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_barcode_stats_admin_only(self):
+        """Test barcode cache counters are only exposed to staff"""
+        res = self.client.get(barcode_stats_url())
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(barcode_stats_url())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('misses', res.data['cache'])
+
 
 class ProductImageUploadTests(TestCase):
 
@@ -176,6 +809,52 @@ class ProductImageUploadTests(TestCase):
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.product.image.path))
 
+    @override_settings(PRODUCT_IMAGE_VARIANTS={
+        'SIZES': (4, 8), 'FORMATS': ('jpeg', 'webp'), 'ASYNC': False,
+    })
+    def test_upload_image_variants(self):
+        """Test resized variants of uploaded images are listed"""
+        url = image_upload_url(self.product.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            img = Image.new('RGB', (20, 10))
+            img.save(ntf, format='JPEG')
+            ntf.seek(0)
+            self.client.post(url, {'image': ntf}, format='multipart')
+
+        res = self.client.get(detail_url(self.product.id))
+
+        srcset = res.data['srcset']
+        self.assertEqual(set(srcset), {'jpeg', 'webp'})
+        self.assertEqual(set(srcset['webp']), {'4', '8'})
+        self.product.refresh_from_db()
+        for widths in json.loads(self.product.image_variants).values():
+            for width, name in widths.items():
+                with Image.open(default_storage.open(name)) as variant:
+                    self.assertEqual(variant.width, int(width))
+                default_storage.delete(name)
+
+    @override_settings(PRODUCT_IMAGE_VARIANTS={
+        'SIZES': (4,), 'FORMATS': ('jpeg',), 'ASYNC': False,
+    })
+    def test_render_variants_plain_storage(self):
+        """Test variants are replaced on storages without replace()"""
+        with tempfile.TemporaryDirectory() as root:
+            storage = FileSystemStorage(location=root)
+            buffer = BytesIO()
+            Image.new('RGB', (20, 10)).save(buffer, format='JPEG')
+            name = storage.save('product.jpg', ContentFile(buffer.getvalue()))
+
+            with patch('shop.images.default_storage', storage):
+                render_variants(name)
+                variants = render_variants(name)
+
+            self.assertEqual(
+                variants, {'jpeg': {'4': 'variants/product/4.jpeg'}}
+            )
+            self.assertEqual(
+                storage.listdir('variants/product'), ([], ['4.jpeg'])
+            )
+
     def test_upload_image_bad_request(self):
         """Test uploading an invalid image"""
         url = image_upload_url(self.product.id)
@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 from django.urls import reverse
 from django.test import TestCase
 from django.contrib.auth import get_user_model
@@ -5,7 +7,10 @@ from django.contrib.auth import get_user_model
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from shop.models import Shop, Product, Address
+from shop.bloom import barcode_bloom
+from shop.cache import barcode_cache
+from shop.models import Shop, Product, ShopProduct, Address, \
+    CatalogChange
 from shop.serializers import ShopSerializer, AddressSerializer
 
 
@@ -20,6 +25,34 @@ def detail_url(shop_id):
     return reverse('shop:shop-detail', args=[shop_id])
 
 
+def shop_barcode_url(shop_id, barcode):
+    """Return shop scoped barcode lookup URL"""
+    return reverse('shop:shop-barcode', args=[shop_id, barcode])
+
+
+def shop_products_url(shop_id):
+    """Return shop products sub-resource URL"""
+    return reverse('shop:shop-products', args=[shop_id])
+
+
+def shop_products_change_url(shop_id, change):
+    """Return shop products add or remove URL"""
+    return reverse(f'shop:shop-{change}-products', args=[shop_id])
+
+
+def shop_low_stock_url(shop_id):
+    """Return shop low stock URL"""
+    return reverse('shop:shop-low-stock', args=[shop_id])
+
+
+def shop_restock_url(shop_id):
+    """Return shop restock URL"""
+    return reverse('shop:shop-restock', args=[shop_id])
+
+
+NEARBY_URL = reverse('shop:shop-nearby')
+
+
 def sample_address():
     return Address.objects.create(
         user=get_user_model().objects.create_user(
@@ -150,6 +183,369 @@ class ShopTests(TestCase):
         self.assertIn(product1, products)
         self.assertIn(product2, products)
 
+    def test_get_shop_product_by_barcode(self):
+        """Test barcode lookup is limited to products the shop carries"""
+        product = Product.objects.create(
+            user=self.user,
+            name='Product name 1',
+            description='Product description 1',
+            quantity=5,
+            price=10,
+            barcode='98769868768',
+        )
+        address = sample_address()
+        shop = Shop.objects.create(user=self.user, name='A', address=address)
+        other = Shop.objects.create(user=self.user, name='B', address=address)
+        shop.products.add(product)
+
+        res = self.client.get(shop_barcode_url(shop.id, product.barcode))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['id'], product.id)
+
+        res = self.client.get(shop_barcode_url(other.id, product.barcode))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        other.products.add(product)
+        res = self.client.get(shop_barcode_url(other.id, product.barcode))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @patch.object(barcode_cache, 'single_process', True)
+    def test_shop_barcode_cache_invalidated_on_removal(self):
+        """Test a product removed from a shop is no longer served from the
+        shop's cached lookups"""
+        barcode_bloom.rebuild()
+        product = Product.objects.create(
+            user=self.user,
+            name='Product name 1',
+            description='Product description 1',
+            quantity=5,
+            price=10,
+            barcode='ABC-400',
+        )
+        shop = Shop.objects.create(
+            user=self.user, name='A', address=sample_address()
+        )
+        shop.products.add(product)
+        self.client.get(shop_barcode_url(shop.id, product.barcode))
+        with self.assertNumQueries(0):
+            res = self.client.get(shop_barcode_url(shop.id, product.barcode))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        shop.products.remove(product)
+        res = self.client.get(shop_barcode_url(shop.id, product.barcode))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_shop_products(self):
+        """Test the shop products are listed page by page and filtered"""
+        shop = Shop.objects.create(
+            user=self.user, name='A', address=sample_address()
+        )
+        products = [
+            Product.objects.create(
+                user=self.user, name=f'Product {i}', description='',
+                quantity=i, price=10 * i, barcode=f'1239832798{i:03}'
+            )
+            for i in range(12)
+        ]
+        shop.products.add(*products[:11])
+
+        res = self.client.get(shop_products_url(shop.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 11)
+        self.assertEqual(len(res.data['results']), 10)
+        self.assertIsNotNone(res.data['next'])
+        self.assertNotIn(products[11].id,
+                         [item['id'] for item in res.data['results']])
+
+        res = self.client.get(shop_products_url(shop.id),
+                              {'price_min': 50, 'fields': 'id,name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {item['id'] for item in res.data['results']},
+            {product.id for product in products[5:11]}
+        )
+        self.assertEqual(set(res.data['results'][0]), {'id', 'name'})
+
+    def test_list_shop_products_not_found(self):
+        """Test listing the products of a missing shop"""
+        res = self.client.get(shop_products_url(1000))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_shops_products_count(self):
+        """Test shops report a product count in a constant number of
+        queries"""
+        address = sample_address()
+        for i in range(3):
+            shop = Shop.objects.create(
+                user=self.user, name=f'Shop {i}', address=address
+            )
+            shop.products.add(*(
+                Product.objects.create(
+                    user=self.user, name='Product', description='',
+                    quantity=1, price=1, barcode=f'98769868{i}{j:02}'
+                )
+                for j in range(i)
+            ))
+
+        with self.assertNumQueries(1):
+            res = self.client.get(SHOP_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(shop['products_count'] for shop in res.data), [0, 1, 2]
+        )
+        self.assertNotIn('products', res.data[0])
+
+    def test_update_shop_products_count(self):
+        """Test an update reports the count of the saved products"""
+        shop = Shop.objects.create(
+            user=self.user, name='A', address=sample_address()
+        )
+        product = Product.objects.create(
+            user=self.user, name='Product', description='',
+            quantity=1, price=1, barcode='ABC0'
+        )
+
+        res = self.client.patch(detail_url(shop.id), {
+            'products': [product.id],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['products_count'], 1)
+
+    def test_add_and_remove_shop_products(self):
+        """Test changing a shop's products by id and barcode"""
+        shop = Shop.objects.create(
+            user=self.user, name='A', address=sample_address()
+        )
+        products = [
+            Product.objects.create(
+                user=self.user, name=f'Product {i}', description='',
+                quantity=1, price=1, barcode=f'ABC{i}'
+            )
+            for i in range(4)
+        ]
+        shop.products.add(products[0])
+        version = Shop.objects.get(pk=shop.pk).catalog_version
+        url = shop_products_change_url(shop.id, 'add')
+
+        with self.assertNumQueries(8):
+            res = self.client.post(url, {
+                'products': [products[0].id, products[1].id],
+                'barcodes': ['ABC2'],
+            }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['added'],
+                         [products[1].id, products[2].id])
+        self.assertEqual(set(shop.products.all()), set(products[:3]))
+        shop.refresh_from_db()
+        self.assertEqual(shop.catalog_version, version + 1)
+        self.assertEqual(CatalogChange.objects.filter(
+            shop_id=shop.id, deleted=False
+        ).count(), 3)
+
+        res = self.client.post(shop_products_change_url(shop.id, 'remove'), {
+            'barcodes': ['ABC0', 'ABC3'],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['removed'], [products[0].id])
+        self.assertEqual(set(shop.products.all()), set(products[1:3]))
+        self.assertTrue(CatalogChange.objects.filter(
+            shop_id=shop.id, product_id=products[0].id, deleted=True
+        ).exists())
+
+    def test_list_shop_low_stock(self):
+        """Test listing the products a shop is running out of"""
+        shop = Shop.objects.create(
+            user=self.user, name='A', address=sample_address()
+        )
+        for i, quantity in enumerate((0, 3, 50)):
+            ShopProduct.objects.create(
+                shop=shop, quantity=quantity, product=Product.objects.create(
+                    user=self.user, name=f'Product {i}', description='',
+                    quantity=1, price=1, barcode=f'ABC{i}'
+                )
+            )
+
+        res = self.client.get(shop_low_stock_url(shop.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 2)
+        self.assertEqual(
+            [(item['product']['name'], item['quantity'])
+             for item in res.data['results']],
+            [('Product 0', 0), ('Product 1', 3)]
+        )
+
+        res = self.client.get(shop_low_stock_url(shop.id), {'threshold': 0})
+        self.assertEqual(res.data['count'], 1)
+
+        res = self.client.get(shop_low_stock_url(shop.id), {'threshold': 'x'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_restock_shop(self):
+        """Test added products start out of stock until restocked"""
+        shop = Shop.objects.create(
+            user=self.user, name='A', address=sample_address()
+        )
+        products = [
+            Product.objects.create(
+                user=self.user, name=f'Product {i}', description='',
+                quantity=100, price=1, barcode=f'ABC{i}'
+            )
+            for i in range(3)
+        ]
+        self.client.post(shop_products_change_url(shop.id, 'add'), {
+            'products': [product.id for product in products[:2]],
+        }, format='json')
+
+        res = self.client.post(shop_restock_url(shop.id), {'items': [
+            {'product': products[0].id, 'quantity': 5},
+            {'product': products[0].id, 'quantity': 2},
+        ]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['product']['id'], item['quantity']) for item in res.data],
+            [(products[0].id, 7)]
+        )
+        self.assertEqual(
+            ShopProduct.objects.get(shop=shop, product=products[1]).quantity,
+            0
+        )
+
+        res = self.client.post(shop_restock_url(shop.id), {'items': [
+            {'product': products[1].id, 'quantity': 1},
+            {'product': products[2].id, 'quantity': 1},
+        ]}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            ShopProduct.objects.get(shop=shop, product=products[1]).quantity,
+            0
+        )
+
+        res = self.client.post(shop_restock_url(shop.id), {'items': [
+            {'product': products[1].id, 'quantity': 0},
+        ]}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_shop_detail_etag_follows_products(self):
+        """Test the shop ETag changes with the products it carries"""
+        shop = Shop.objects.create(
+            user=self.user, name='A', address=sample_address()
+        )
+        product = Product.objects.create(
+            user=self.user, name='Product', description='',
+            quantity=1, price=1, barcode='ABC1'
+        )
+        etag = self.client.get(detail_url(shop.id))['ETag']
+
+        self.client.post(shop_products_change_url(shop.id, 'add'), {
+            'products': [product.id],
+        }, format='json')
+        res = self.client.get(detail_url(shop.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['products_count'], 1)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(
+                detail_url(shop.id), HTTP_IF_NONE_MATCH=res['ETag']
+            )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_add_shop_products_unknown(self):
+        """Test unknown products are rejected and nothing is added"""
+        shop = Shop.objects.create(
+            user=self.user, name='A', address=sample_address()
+        )
+        product = Product.objects.create(
+            user=self.user, name='Product', description='',
+            quantity=1, price=1, barcode='ABC1'
+        )
+        url = shop_products_change_url(shop.id, 'add')
+
+        res = self.client.post(url, {
+            'products': [product.id, 1000], 'barcodes': ['XYZ'],
+        }, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('products', res.data)
+        self.assertIn('barcodes', res.data)
+        self.assertFalse(shop.products.exists())
+
+        res = self.client.post(url, {}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_nearby_shops(self):
+        """Test listing the shops around a point, nearest first"""
+        places = {
+            'Timisoara': (45.7489, 21.2087),
+            'Timisoara Nord': (45.7508, 21.2070),
+            'Arad': (46.1866, 21.3123),
+        }
+        for name, (latitude, longitude) in places.items():
+            Shop.objects.create(
+                user=self.user, name=name,
+                address=Address.objects.create(
+                    user=self.user, country='Romania', postcode=300000,
+                    region='Timis', city=name, street='Main', number='1',
+                    latitude=latitude, longitude=longitude
+                )
+            )
+        Shop.objects.create(user=self.user, name='No coordinates',
+                            address=sample_address())
+
+        with self.assertNumQueries(2):
+            res = self.client.get(
+                NEARBY_URL, {'lat': 45.7500, 'lon': 21.2080, 'radius': 5}
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([shop['name'] for shop in res.data],
+                         ['Timisoara Nord', 'Timisoara'])
+        self.assertLess(res.data[0]['distance'], res.data[1]['distance'])
+
+        res = self.client.get(
+            NEARBY_URL, {'lat': 45.7500, 'lon': 21.2080, 'radius': 50}
+        )
+
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(res.data[-1]['name'], 'Arad')
+
+    def test_nearby_shops_invalid(self):
+        """Test nearby shops need a valid point and radius"""
+        res = self.client.get(NEARBY_URL, {'lat': 95, 'lon': 21})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(NEARBY_URL, {'lat': 45, 'lon': 21,
+                                           'radius': 5000})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_address_geohash(self):
+        """Test address coordinates are indexed by geohash"""
+        address = sample_address()
+        self.assertIsNone(address.geohash)
+
+        res = self.client.patch(address_detail_url(address.id), {
+            'latitude': 45.7489, 'longitude': 21.2087
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        address.refresh_from_db()
+        self.assertTrue(address.geohash.startswith('u2ph6'))
+
+        res = self.client.patch(address_detail_url(address.id),
+                                {'latitude': ''})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_retrieve_addresses(self):
         """Test retrieving addresses"""
         Address.objects.create(
@@ -0,0 +1,105 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from shop.models import Shop, Product, ShopProduct, Address
+from shop.stock import NotCarried, OutOfStock, decrement_stock, \
+    low_stock, restock
+
+
+class StockTests(TestCase):
+    """Test the per shop stock"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@test.com',
+            password='test123'
+        )
+        self.shop = Shop.objects.create(
+            user=self.user,
+            name='ABC Corner',
+            address=Address.objects.create(
+                user=self.user, country='Romania', postcode=574479,
+                region='Timis', city='Timisoara', street='Gheorghe Lazar',
+                number='24 A'
+            )
+        )
+        self.products = [
+            Product.objects.create(
+                user=self.user, name=f'Product {i}', description='',
+                quantity=100, price=1, barcode=f'ABC{i}'
+            )
+            for i in range(3)
+        ]
+        for product, quantity in zip(self.products, (5, 20, 1)):
+            ShopProduct.objects.create(
+                shop=self.shop, product=product, quantity=quantity
+            )
+
+    def stock(self):
+        return dict(
+            ShopProduct.objects.filter(shop=self.shop)
+            .values_list('product_id', 'quantity')
+        )
+
+    def test_decrement_stock(self):
+        """Test stock is decremented in a single statement"""
+        first, second, third = (product.id for product in self.products)
+
+        with self.assertNumQueries(3):
+            decrement_stock(self.shop.id, {first: 5, second: 3, third: 0})
+
+        self.assertEqual(self.stock(), {first: 0, second: 17, third: 1})
+
+    def test_decrement_stock_out_of_stock(self):
+        """Test nothing is decremented when a product runs short"""
+        first, second, third = (product.id for product in self.products)
+
+        with self.assertRaises(OutOfStock) as cm:
+            decrement_stock(self.shop.id, {first: 2, second: 21, third: 1})
+
+        self.assertEqual(cm.exception.product_ids, {second})
+        self.assertEqual(self.stock(), {first: 5, second: 20, third: 1})
+
+    def test_decrement_stock_not_carried(self):
+        """Test products the shop does not carry are out of stock"""
+        other = Product.objects.create(
+            user=self.user, name='Other', description='',
+            quantity=100, price=1, barcode='XYZ'
+        )
+
+        with self.assertRaises(OutOfStock) as cm:
+            decrement_stock(self.shop.id, {other.id: 1})
+
+        self.assertEqual(cm.exception.product_ids, {other.id})
+
+    def test_restock(self):
+        """Test stock is added in a single statement"""
+        first, second, third = (product.id for product in self.products)
+
+        with self.assertNumQueries(3):
+            restock(self.shop.id, {first: 10, third: 4})
+
+        self.assertEqual(self.stock(), {first: 15, second: 20, third: 5})
+
+    def test_restock_not_carried(self):
+        """Test nothing is restocked when the shop lacks a product"""
+        first = self.products[0].id
+        other = Product.objects.create(
+            user=self.user, name='Other', description='',
+            quantity=100, price=1, barcode='XYZ'
+        )
+
+        with self.assertRaises(NotCarried) as cm:
+            restock(self.shop.id, {first: 1, other.id: 1})
+
+        self.assertEqual(cm.exception.product_ids, {other.id})
+        self.assertEqual(self.stock()[first], 5)
+
+    def test_low_stock(self):
+        """Test low stock lists the products lowest first"""
+        rows = low_stock(self.shop.id, 5)
+
+        self.assertEqual(
+            [(row.product_id, row.quantity) for row in rows],
+            [(self.products[2].id, 1), (self.products[0].id, 5)]
+        )
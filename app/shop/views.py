@@ -1,54 +1,474 @@
 from rest_framework.decorators import action
 from rest_framework import viewsets, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.permissions import IsAdminUser
 
+from django.conf import settings
+from django.db.models import Count, Q
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 
-from .models import Shop, Product, Address
+from core.http import file_response
+from core.mixins import ConditionalListMixin, ConditionalRetrieveMixin, \
+    SparseFieldsMixin
+
+from . import assortment, stock
+from .geo import haversine, nearby_filter
+from .bloom import barcode_bloom
+from .cache import barcode_cache
+from .catalog import build_catalog_pack, catalog_etag
+from .changes import changes_after, format_cursor, parse_cursor
+from .gtin import BARCODE_RE, canonical_barcode, barcode_filter, \
+    normalize_gtin, product_key
+from .images import schedule_image_variants
+from .index import barcode_index, FIELDS as INDEX_FIELDS
+from .pagination import ProductPagination, StockPagination
+from .search import search_products
+from .models import LOW_STOCK_THRESHOLD, Shop, Product, Address
 
 from .serializers import ShopSerializer, ProductSerializer, \
-                            ProductImageSerializer, AddressSerializer
+                            ProductImageSerializer, AddressSerializer, \
+                            BarcodeListSerializer, ProductFilterSerializer, \
+                            ShopProductsSerializer, ShopStockSerializer, \
+                            NearbySerializer, RestockSerializer
 
 
-class ShopViewSet(viewsets.ModelViewSet):
-    """ViewSet for Shop"""
+def get_barcode_filter(barcode):
+    """Return Product filter kwargs for barcode, rejecting malformed ones
+    before they reach the database"""
+    try:
+        return barcode_filter(barcode)
+    except ValueError as exc:
+        raise ValidationError({'barcode': [str(exc)]})
+
+
+def get_product_by_barcode(barcode, lookup, **filters):
+    """Return the product for a barcode lookup, falling back to the exact
+    barcode for legacy duplicates of a GTIN no product holds any more"""
+    product = Product.objects.filter(**filters, **lookup).first()
+    if product is None and 'gtin' in lookup:
+        product = Product.objects.filter(**filters, barcode=barcode).first()
+    if product is None:
+        raise Http404
+    return product
+
+
+def filter_products(queryset, params):
+    """Filter a product queryset on the list query parameters and rank it
+    on ?q= when given"""
+    filters = ProductFilterSerializer(data=params.dict())
+    filters.is_valid(raise_exception=True)
+    queryset = queryset.filter(**filters.get_lookups())
+    text = params.get('q')
+    if text:
+        queryset = search_products(queryset, text)
+
+    return queryset
+
+
+class ShopViewSet(SparseFieldsMixin, ConditionalListMixin,
+                  ConditionalRetrieveMixin, viewsets.ModelViewSet):
+    """ViewSet for Shop.
+
+    Shops report how many products they carry; the products themselves are
+    listed page by page under shops/{id}/products/.
+    """
 
     serializer_class = ShopSerializer
-    queryset = Shop.objects.all()
+    queryset = Shop.objects.annotate(products_count=Count('products'))
+    sparse_actions = ('list', 'retrieve', 'products')
+
+    def get_queryset(self):
+        """Return the shop's products for the products action"""
+        if self.action == 'products':
+            return filter_products(
+                Product.objects.filter(shop=self.kwargs['pk'])
+                .order_by('-created_at'),
+                self.request.query_params
+            )
+        return super().get_queryset()
+
+    def perform_update(self, serializer):
+        """Re-read the shop so products_count counts the saved products"""
+        super().perform_update(serializer)
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk
+        )
+
+    @action(methods=['GET'], detail=False, url_path='nearby')
+    def nearby(self, request):
+        """List the active shops within ?radius= km of ?lat=&lon=, nearest
+        first, with their distance in km"""
+        params = NearbySerializer(data=request.query_params.dict())
+        params.is_valid(raise_exception=True)
+        lat, lon, radius, limit = (
+            params.validated_data[name]
+            for name in ('lat', 'lon', 'radius', 'limit')
+        )
+
+        candidates = Shop.objects.filter(
+            nearby_filter(lat, lon, radius, prefix='address__'),
+            is_active=True
+        ).values_list('id', 'address__latitude', 'address__longitude')
+        distances = {}
+        for pk, latitude, longitude in candidates:
+            distance = haversine(lat, lon, latitude, longitude)
+            if distance <= radius:
+                distances[pk] = distance
+        nearest = sorted(distances, key=distances.get)[:limit]
+
+        shops = self.get_queryset().in_bulk(nearest)
+        data = []
+        for pk in nearest:
+            item = self.get_serializer(shops[pk]).data
+            item['distance'] = round(distances[pk], 3)
+            data.append(item)
+
+        return Response(data, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=True, url_path='products',
+            serializer_class=ProductSerializer,
+            pagination_class=ProductPagination)
+    def products(self, request, pk=None):
+        """List the products carried by the shop, paginated and filtered
+        like the product list"""
+        get_object_or_404(Shop, pk=pk)
+        return self.list(request)
+
+    @action(methods=['POST'], detail=True, url_path='products/add',
+            serializer_class=ShopProductsSerializer)
+    def add_products(self, request, pk=None):
+        """Add the products given by id or barcode to the shop"""
+        return self.change_products(request, pk, assortment.add_products,
+                                    'added')
+
+    @action(methods=['POST'], detail=True, url_path='products/remove',
+            serializer_class=ShopProductsSerializer)
+    def remove_products(self, request, pk=None):
+        """Remove the products given by id or barcode from the shop"""
+        return self.change_products(request, pk, assortment.remove_products,
+                                    'removed')
+
+    @action(methods=['GET'], detail=True, url_path='low-stock',
+            serializer_class=ShopStockSerializer,
+            pagination_class=StockPagination)
+    def low_stock(self, request, pk=None):
+        """List the shop's products running out of stock, lowest first.
+
+        ?threshold= defaults to and is capped at the highest stock level
+        the partial low stock index covers.
+        """
+        get_object_or_404(Shop, pk=pk)
+        try:
+            threshold = int(request.query_params.get(
+                'threshold', LOW_STOCK_THRESHOLD
+            ))
+        except ValueError:
+            raise ValidationError({'detail': 'threshold must be an integer.'})
+
+        page = self.paginate_queryset(stock.low_stock(pk, threshold))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=['POST'], detail=True, url_path='restock',
+            serializer_class=RestockSerializer)
+    def restock(self, request, pk=None):
+        """Add stock of products the shop carries and return their stock"""
+        get_object_or_404(Shop, pk=pk)
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        quantities = serializer.validated_data['quantities']
+        try:
+            stock.restock(pk, quantities)
+        except stock.NotCarried as exc:
+            raise ValidationError({'items': [
+                'Not carried: '
+                f'{", ".join(map(str, sorted(exc.product_ids)))}.'
+            ]})
+
+        rows = stock.stock_rows(shop_id=pk, product_id__in=quantities)\
+            .order_by('product_id')
+        return Response(
+            ShopStockSerializer(rows, many=True).data,
+            status=status.HTTP_200_OK
+        )
+
+    def change_products(self, request, pk, change, key):
+        shop = get_object_or_404(Shop, pk=pk)
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        changed = change(shop, serializer.validated_data['product_ids'])
+        return Response({key: sorted(changed)}, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=True,
+            url_path='barcode/(?P<barcode>[^/.]+)')
+    def barcode(self, request, pk=None, barcode=None):
+        """Get a product carried by the shop by product barcode"""
+        lookup = get_barcode_filter(barcode)
+        key = canonical_barcode(barcode)
+        if not barcode_bloom.might_contain(key):
+            raise Http404
 
+        def load():
+            product = get_product_by_barcode(barcode, lookup, shop=pk)
+            return dict(ProductSerializer(product).data)
 
-class ProductViewSet(viewsets.ModelViewSet):
+        return Response(
+            barcode_cache.get_or_set(f'{pk}/{key}', load),
+            status=status.HTTP_200_OK
+        )
+
+    @action(methods=['GET'], detail=True, url_path='catalog')
+    def catalog(self, request, pk=None):
+        """Download the shop's products as a gzipped SQLite catalog pack.
+
+        Supports If-None-Match against the catalog version ETag and byte
+        ranges for resumed downloads.
+        """
+        shop = self.get_object()
+        etag = catalog_etag(shop)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+
+        return file_response(
+            request,
+            build_catalog_pack(shop),
+            'application/gzip',
+            etag=etag,
+            cache_control='private, no-cache',
+            filename=f'catalog-{shop.id}-{shop.catalog_version}.sqlite.gz'
+        )
+
+
+class ProductViewSet(SparseFieldsMixin, ConditionalListMixin,
+                     ConditionalRetrieveMixin, viewsets.ModelViewSet):
     """ViewSet for Product"""
 
     serializer_class = ProductSerializer
     queryset = Product.objects.all().order_by('-created_at')
-    pagination_class = PageNumberPagination
-    pagination_class.page_size = 10
+    pagination_class = ProductPagination
+
+    def get_queryset(self):
+        """Filter the product list on its query parameters and rank it on
+        ?q= when given. ?cursor= pages keep newest first order instead,
+        see ProductPagination."""
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+
+        return filter_products(queryset, self.request.query_params)
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
         if self.action == 'upload_image':
             return ProductImageSerializer
+        if self.action == 'barcodes':
+            return BarcodeListSerializer
 
         return self.serializer_class
 
     @action(methods=['GET'], detail=False,
             url_path='barcode/(?P<barcode>[^/.]+)')
     def barcode(self, request, barcode=None):
-        """Get a shop product by product barcode"""
+        """Get a shop product by product barcode.
+
+        Scanners asking only for fields in the barcode index, e.g.
+        ?fields=id,name,price, are answered from the memory-mapped index
+        unless the product changed after the indexed row. Other requests
+        need fields the index does not hold and go through the cache.
+        """
+        lookup = get_barcode_filter(barcode)
+        key = canonical_barcode(barcode)
+        if not barcode_bloom.might_contain(key):
+            raise Http404
+
+        fields = request.query_params.get('fields')
+        fields = fields.split(',') if fields else None
+        if fields and set(fields) <= set(INDEX_FIELDS):
+            found = barcode_index.lookup(key)
+            if found and not barcode_cache.changed_since(key, found[0]):
+                return Response(
+                    {name: found[1][name] for name in fields},
+                    status=status.HTTP_200_OK
+                )
+
+        def load():
+            product = get_product_by_barcode(barcode, lookup)
+            return dict(ProductSerializer(product).data)
+
+        data = barcode_cache.get_or_set(key, load)
+        if fields:
+            data = {name: data[name] for name in fields if name in data}
+
+        return Response(data, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=False,
+            url_path='barcode-prefix/(?P<prefix>[^/.]+)')
+    def barcode_prefix(self, request, prefix=None):
+        """Get the products whose barcode starts with prefix, for hand
+        typed partial barcodes.
+
+        The prefix is matched on the barcode pattern index (the _like
+        index of the unique barcode column on PostgreSQL); the minimum
+        prefix length and the result cap keep it a short range scan.
+        """
+        if len(prefix) < settings.BARCODE_PREFIX_MIN_LENGTH or \
+                not BARCODE_RE.fullmatch(prefix):
+            raise ValidationError({'prefix': [
+                f'Enter at least {settings.BARCODE_PREFIX_MIN_LENGTH} '
+                f'barcode characters.'
+            ]})
+        try:
+            limit = min(int(request.query_params.get('limit', 10)),
+                        settings.BARCODE_PREFIX_MAX_RESULTS)
+        except ValueError:
+            raise ValidationError({'detail': 'limit must be an integer.'})
 
-        product = get_object_or_404(Product, barcode=barcode)
-        serializer = ProductSerializer(product)
+        products = Product.objects.filter(
+            barcode__startswith=prefix
+        ).order_by('barcode')[:max(limit, 1)]
+        serializer = ProductSerializer(products, many=True)
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(methods=['POST'], detail=False, url_path='barcodes')
+    def barcodes(self, request):
+        """Get shop products for a list of barcodes, keyed by barcode"""
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        barcodes = list(dict.fromkeys(serializer.validated_data['barcodes']))
+        keys = {}
+        for code in barcodes:
+            try:
+                keys[code] = canonical_barcode(code)
+            except ValueError:
+                pass
+
+        unique_keys = list(dict.fromkeys(keys.values()))
+        chunk_size = settings.BARCODE_BATCH_CHUNK_SIZE
+        products = {}
+        for start in range(0, len(unique_keys), chunk_size):
+            chunk = [barcode_filter(key) for key in
+                     unique_keys[start:start + chunk_size]]
+            gtins = [lookup['gtin'] for lookup in chunk if 'gtin' in lookup]
+            codes = [lookup['barcode'] for lookup in chunk
+                     if 'barcode' in lookup]
+            queryset = Product.objects.filter(
+                Q(gtin__in=gtins) | Q(barcode__in=codes)
+            )
+            for product in queryset:
+                products[product.gtin or product.barcode] = product
+
+        # Legacy duplicates of GTINs no product holds any more
+        fallback = [code for code, key in keys.items()
+                    if key not in products and normalize_gtin(key) == key]
+        if fallback:
+            for product in Product.objects.filter(barcode__in=fallback):
+                products.setdefault(
+                    product_key(product.gtin, product.barcode), product
+                )
+
+        data = ProductSerializer(products.values(), many=True).data
+        found = dict(zip(products.keys(), data))
+        not_found = {'detail': 'Not found.'}
+        malformed = {'detail': 'Malformed barcode.'}
 
         return Response(
-            serializer.data,
+            {
+                code: found.get(keys[code], not_found)
+                if code in keys else malformed
+                for code in barcodes
+            },
             status=status.HTTP_200_OK
         )
 
+    @action(methods=['GET'], detail=False, url_path='changes')
+    def changes(self, request):
+        """Get the catalog changes after the ?since= cursor.
+
+        Returns upserted products, tombstones of deleted products and shop
+        membership changes, with the cursor to pass on the next call.
+        """
+        try:
+            since = parse_cursor(request.query_params.get('since', '0'))
+            limit = min(
+                int(request.query_params.get('limit',
+                                             settings.CHANGE_FEED_PAGE_SIZE)),
+                settings.CHANGE_FEED_PAGE_SIZE
+            )
+        except ValueError:
+            raise ValidationError(
+                {'detail': 'Malformed since cursor or limit.'}
+            )
+
+        page = changes_after(since, limit + 1)
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        products = {}
+        memberships = {}
+        for change in page:
+            if change.shop_id is None:
+                products[change.product_id] = change.deleted
+            else:
+                memberships[(change.shop_id, change.product_id)] = \
+                    change.deleted
+
+        upserts = Product.objects.filter(
+            id__in=[pk for pk, deleted in products.items() if not deleted]
+        ).order_by('id')
+        upserts = ProductSerializer(upserts, many=True).data
+        found = {product['id'] for product in upserts}
+
+        return Response({
+            'cursor': format_cursor(
+                *((page[-1].txid, page[-1].id) if page else since)
+            ),
+            'has_more': has_more,
+            'upserts': upserts,
+            'tombstones': [pk for pk in products if pk not in found],
+            'memberships': [
+                {'shop': shop_id, 'product': product_id, 'deleted': deleted}
+                for (shop_id, product_id), deleted in memberships.items()
+            ],
+        }, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=False, url_path='barcode-stats',
+            permission_classes=[IsAdminUser])
+    def barcode_stats(self, request):
+        """Report barcode lookup cache and filter stats for this worker"""
+        return Response({
+            'cache': barcode_cache.stats(),
+            'bloom': barcode_bloom.stats(),
+            'index': barcode_index.stats(),
+        })
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
-        """Upload an image to a product"""
+        """Upload an image to a product.
+
+        Resized variants are built in the background and listed in srcset
+        once ready.
+        """
         product = self.get_object()
         serializer = self.get_serializer(
             product,
@@ -56,7 +476,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         )
 
         if serializer.is_valid():
-            serializer.save()
+            schedule_image_variants(serializer.save(image_variants=''))
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK
@@ -67,7 +487,8 @@ class ProductViewSet(viewsets.ModelViewSet):
         )
 
 
-class AddressViewSet(viewsets.ModelViewSet):
+class AddressViewSet(ConditionalListMixin, ConditionalRetrieveMixin,
+                     viewsets.ModelViewSet):
     """ViewSet for Shop"""
 
     serializer_class = AddressSerializer